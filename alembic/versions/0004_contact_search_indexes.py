@@ -0,0 +1,62 @@
+"""add contact search indexes (pg_trgm on Postgres, FTS5 on SQLite)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts "
+            "USING gin (owner_id, lower(name || ' ' || email || ' ' || phone) gin_trgm_ops)"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+            "name, email, phone, content='contacts', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+            "INSERT INTO contacts_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, name, email, phone) "
+            "VALUES ('delete', old.id, old.name, old.email, old.phone); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, name, email, phone) "
+            "VALUES ('delete', old.id, old.name, old.email, old.phone); "
+            "INSERT INTO contacts_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END"
+        )
+        # Індексуємо контакти, що вже є в таблиці
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_contacts_search_trgm")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ai")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
@@ -0,0 +1,53 @@
+"""add contact timestamps, tombstones and sync version
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite cannot ADD COLUMN with a non-constant default, so timestamps are added
+    # as nullable, backfilled and then made NOT NULL with a server default. On SQLite
+    # batch mode recreates the table for that; elsewhere it is a plain ALTER COLUMN
+    op.add_column('contacts', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('contacts', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('contacts', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.execute("UPDATE contacts SET created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP")
+
+    bind = op.get_bind()
+    triggers = []
+    if bind.dialect.name == 'sqlite':
+        # Recreating the table drops its triggers (the FTS5 sync triggers from 0004)
+        triggers = list(bind.scalars(
+            sa.text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'contacts'")
+        ))
+    with op.batch_alter_table('contacts') as batch_op:
+        for column in ('created_at', 'updated_at'):
+            batch_op.alter_column(
+                column, existing_type=sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+            )
+    for trigger in triggers:
+        op.execute(trigger)
+    op.create_index('ix_contacts_owner_version_id', 'contacts', ['owner_id', 'version', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_owner_version_id', table_name='contacts')
+    op.drop_column('contacts', 'version')
+    op.drop_column('contacts', 'deleted_at')
+    op.drop_column('contacts', 'updated_at')
+    op.drop_column('contacts', 'created_at')
@@ -0,0 +1,32 @@
+"""add avatar blobs
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'avatar_blobs',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('content_hash'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('avatar_blobs')
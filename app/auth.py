@@ -1,15 +1,15 @@
-import json
 from datetime import datetime, timedelta
+from typing import Optional
 
-import redis
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import crud, models, schemas, utils
+from . import cache, crud, database, schemas, utils
 from .config import settings
-from .database import SessionLocal
+from .principal import Principal
+from .replicas import get_read_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 from datetime import datetime, timedelta
@@ -22,9 +22,6 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Ініціалізація Redis клієнта через URL з settings (наприклад, "redis://localhost:6379/0")
-redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
     Створює JWT токен доступу.
@@ -51,53 +48,99 @@ def decode_access_token(token: str):
     except JWTError:
         return None
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# Конкурентні промахи кешу для одного email обслуговує один запит до БД
+user_loads = cache.SingleFlight()
+
+async def _fetch_user(email: str, db: AsyncSession) -> Optional[Principal]:
+    user = await crud.get_user_by_email(db, email)
+    principal = Principal.from_user(user) if user is not None else None
+    # З'єднання повертається в пул ще до запису в кеш та до виконання обробника
+    await database.release(db)
+    # Зберігаємо результат (або його відсутність) в обох рівнях кешу
+    if principal is None:
+        await cache.cache_missing_user(email)
+        return None
+    await cache.cache_user(principal)
+    return principal
+
+async def _load_user(email: str, db: AsyncSession) -> Optional[Principal]:
+    # Спроба отримати користувача з кешу (пам'ять процесу, потім Redis)
+    principal = await cache.get_cached_user(email)
+    if principal is cache.MISSING:
+        return None
+    if principal is not None:
+        return principal
+
+    # Якщо в кеші немає, звертаємось до бази даних — один запит на ключ
+    principal, _ = await user_loads.do(email, lambda: _fetch_user(email, db))
+    return principal
+
+async def _current_token_version(user_id: int, db: AsyncSession) -> Optional[int]:
+    version = await cache.get_cached_token_version(user_id)
+    if version is not None:
+        return version
+    version = await crud.get_token_version(db, user_id)
+    await database.release(db)
+    if version is not None:
+        await cache.cache_token_version(user_id, version)
+    return version
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)
+) -> Principal:
+    """
+    Єдина залежність автентифікації для всіх роутерів.
+
+    Користувач шукається послідовно в кеші процесу, у Redis і лише потім у базі даних.
+    """
     payload = utils.decode_access_token(token)
     if payload is None or "sub" not in payload:
-        raise credentials_exception
-    email: str = payload.get("sub")
-
-    # Спроба отримати користувача з кешу Redis
-    cache_key = f"user:{email}"
-    cached_user = redis_client.get(cache_key)
-    if cached_user:
-        user_data = json.loads(cached_user)
-        return models.User(**user_data)
-
-    # Якщо в кеші немає, звертаємось до бази даних
-    user = crud.get_user_by_email(db, email=email)
+        raise _credentials_exception()
+    user = await _load_user(payload["sub"], db)
     if user is None:
-        raise credentials_exception
-
-    # Формуємо словник для кешування (без чутливих даних)
-    user_dict = {
-        "id": user.id,
-        "email": user.email,
-        "is_active": user.is_active,
-        "is_verified": user.is_verified,
-        "avatar_url": user.avatar_url
-    }
-    # Зберігаємо в Redis на 5 хвилин (300 секунд)
-    redis_client.setex(cache_key, 300, json.dumps(user_dict))
+        raise _credentials_exception()
+    # Self-contained токен, виданий до скидання пароля чи зміни статусу, вже відкликаний
+    if "ver" in payload and payload["ver"] != user.token_version:
+        raise _credentials_exception()
     return user
 
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)
+) -> Principal:
+    """
+    Користувач, від імені якого виконується запит, без повного профілю.
+
+    Для self-contained токенів (з ``uid`` та ``ver``) усі дані беруться з claims,
+    а відкликання перевіряється лише за версією токенів користувача.
+    Для звичайних токенів працює як :func:`get_current_user`.
+    """
+    payload = utils.decode_access_token(token)
+    if payload is None or "sub" not in payload:
+        raise _credentials_exception()
+    if "uid" not in payload or "ver" not in payload:
+        return await get_current_user(token, db)
+
+    version = await _current_token_version(payload["uid"], db)
+    if version is None or version != payload["ver"]:
+        raise _credentials_exception()
+    return Principal(
+        id=payload["uid"],
+        email=payload["sub"],
+        is_active=payload.get("is_active", False),
+        is_verified=payload.get("is_verified", False),
+        token_version=version,
+    )
+
 def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     if not current_user.is_verified:
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional, Tuple
+
+import cloudinary
+import cloudinary.uploader
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, database
+from .config import settings
+from .executors import BoundedProcessPool, avatar_pool
+
+# Формат збережених аватарів: WebP у кілька разів менший за вихідний PNG/JPEG
+AVATAR_FORMAT = "WEBP"
+AVATAR_EXTENSION = "webp"
+_CHUNK_SIZE = 65536
+
+
+class InvalidImageError(ValueError):
+    """
+    Завантажений файл не є зображенням, яке вдається декодувати.
+    """
+
+
+class UploadTooLargeError(ValueError):
+    """
+    Завантажений файл більший за AVATAR_MAX_UPLOAD_BYTES.
+    """
+
+
+class AvatarStorageError(Exception):
+    """
+    Сховище не повернуло URL завантаженого зображення.
+    """
+
+
+def hash_upload(upload: BinaryIO, max_bytes: int) -> str:
+    """
+    Рахує SHA-256 завантаженого файлу, читаючи його частинами, без копії в пам'яті.
+
+    Starlette вже зберіг тіло запиту у SpooledTemporaryFile (великі файли — на диску),
+    тому розмір перевіряється до читання, а функція блокуюча і викликається в пулі потоків.
+
+    :raises UploadTooLargeError: Якщо файл більший за ``max_bytes``.
+    :return: hex-дайджест SHA-256; файл повертається на початок.
+    """
+    upload.seek(0, os.SEEK_END)
+    if upload.tell() > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+    upload.seek(0)
+    digest = hashlib.sha256()
+    while chunk := upload.read(_CHUNK_SIZE):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def resize_image(data: bytes, size: int, quality: int) -> bytes:
+    """
+    Обрізає зображення до квадрата ``size``×``size`` і перекодовує у WebP.
+
+    Виконується в пулі процесів: декодування фото з камери займає сотні мілісекунд CPU.
+
+    :raises InvalidImageError: Якщо файл не вдається декодувати як зображення.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Фото з телефонів зберігають поворот в EXIF; після перекодування EXIF не буде
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, AVATAR_FORMAT, quality=quality)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImageError(str(e)) from None
+    return output.getvalue()
+
+
+class AvatarStorage(ABC):
+    """
+    Сховище оброблених аватарів. Методи блокуючі й викликаються в пулі потоків.
+    """
+
+    @abstractmethod
+    def save(self, key: str, data: bytes) -> str:
+        """
+        Зберігає зображення під ключем ``key`` і повертає його публічний URL.
+
+        :raises AvatarStorageError: Якщо зображення не збережено.
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Аватари в Cloudinary: ключем стає public_id, тож повторне збереження перезаписує файл.
+    """
+
+    def __init__(self, folder: str = "avatars"):
+        self.folder = folder
+        cloudinary.config(
+            cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+            api_key=settings.CLOUDINARY_API_KEY,
+            api_secret=settings.CLOUDINARY_API_SECRET,
+        )
+
+    def save(self, key: str, data: bytes) -> str:
+        result = cloudinary.uploader.upload(
+            data, public_id=key, folder=self.folder, overwrite=True, resource_type="image"
+        )
+        url = result.get("secure_url")
+        if not url:
+            raise AvatarStorageError("Cloudinary returned no secure_url")
+        return url
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Аватари у локальному каталозі (розробка й тести); застосунок роздає їх за ``base_url``.
+    """
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+
+    def save(self, key: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{key}.{AVATAR_EXTENSION}"
+        # Запис через тимчасовий файл: файл за URL ніколи не буває записаним наполовину
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise AvatarStorageError(str(e)) from e
+        return f"{self.base_url}/{name}"
+
+
+def make_storage(kind: str) -> AvatarStorage:
+    if kind == "cloudinary":
+        return CloudinaryStorage()
+    if kind == "local":
+        return LocalStorage(settings.AVATAR_LOCAL_DIR, settings.AVATAR_LOCAL_BASE_URL)
+    raise ValueError(f"AVATAR_STORAGE must be 'cloudinary' or 'local', got {kind!r}")
+
+
+class AvatarPipeline:
+    """
+    Обробка завантаженого аватара поетапно, не блокуючи цикл подій.
+
+    Файл хешується частинами прямо з тимчасового файлу Starlette; якщо такий самий файл
+    уже завантажувався, береться збережений URL і файл у пам'ять не читається. Інакше
+    зображення зменшується в пулі процесів ``resize_pool`` і зберігається в ``storage``
+    у пулі потоків, не більше ``max_concurrent_uploads`` одночасно.
+
+    :param size: Сторона квадратного аватара в пікселях.
+    :param quality: Якість WebP (1–100).
+    """
+
+    def __init__(
+        self,
+        storage: AvatarStorage,
+        resize_pool: BoundedProcessPool,
+        max_concurrent_uploads: int = 4,
+        max_upload_bytes: int = 10485760,
+        size: int = 256,
+        quality: int = 85,
+    ):
+        self.storage = storage
+        self.resize_pool = resize_pool
+        self.max_concurrent_uploads = max(max_concurrent_uploads, 1)
+        self.max_upload_bytes = max_upload_bytes
+        self.size = size
+        self.quality = quality
+        self._upload_slots = asyncio.Semaphore(self.max_concurrent_uploads)
+        self.uploads_in_flight = 0
+        self.uploaded = 0
+        self.deduplicated = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def upload(self, key: str, data: bytes) -> str:
+        """
+        Зберігає зображення в сховищі, обмежуючи кількість одночасних вивантажень.
+        """
+        async with self._upload_slots:
+            self.uploads_in_flight += 1
+            try:
+                url = await run_in_threadpool(self.storage.save, key, data)
+            finally:
+                self.uploads_in_flight -= 1
+        self.uploaded += 1
+        return url
+
+    async def store(self, db: AsyncSession, upload: BinaryIO) -> Tuple[str, Optional[str]]:
+        """
+        Проводить завантажений файл через конвеєр.
+
+        :return: URL аватара та хеш вмісту, якщо файл завантажено вперше
+            (None — знайдено раніше збережене зображення).
+        :raises UploadTooLargeError: Файл завеликий.
+        :raises InvalidImageError: Файл не є зображенням.
+        :raises AvatarStorageError: Сховище не зберегло зображення.
+        """
+        content_hash = await run_in_threadpool(hash_upload, upload, self.max_upload_bytes)
+        url = await crud.get_avatar_url(db, content_hash)
+        # Обробка й вивантаження тривають секунди: з'єднання з базою на цей час повертається в пул
+        await database.release(db)
+        if url is not None:
+            self.deduplicated += 1
+            return url, None
+        # Розмір уже перевірено: воркер отримує не більше max_upload_bytes
+        data = await run_in_threadpool(upload.read)
+        image = await self.resize_pool.run(resize_image, data, self.size, self.quality)
+        self.bytes_in += len(data)
+        self.bytes_out += len(image)
+        return await self.upload(content_hash, image), content_hash
+
+    def stats(self) -> dict:
+        return {
+            "storage": type(self.storage).__name__,
+            "max_concurrent_uploads": self.max_concurrent_uploads,
+            "uploads_in_flight": self.uploads_in_flight,
+            "uploaded": self.uploaded,
+            "deduplicated": self.deduplicated,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+pipeline = AvatarPipeline(
+    make_storage(settings.AVATAR_STORAGE),
+    avatar_pool,
+    max_concurrent_uploads=settings.AVATAR_MAX_CONCURRENT_UPLOADS,
+    max_upload_bytes=settings.AVATAR_MAX_UPLOAD_BYTES,
+    size=settings.AVATAR_SIZE,
+    quality=settings.AVATAR_QUALITY,
+)
@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import redis.asyncio as redis
+
+from .config import settings
+from .principal import Principal
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Потокобезпечний LRU-кеш у пам'яті процесу з обмеженим розміром і TTL записів.
+
+    :param maxsize: Максимальна кількість записів; найстаріші за використанням витісняються.
+    :param ttl: Час життя запису в секундах за замовчуванням (None — без обмеження).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Повертає лічильники кешу для ендпоінта метрик.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# Результат для тих, хто чекав, якщо запит, що виконував loader, скасовано (клієнт відключився)
+_LEADER_CANCELLED = object()
+
+
+class SingleFlight:
+    """
+    Об'єднує конкурентні завантаження одного ключа: loader виконується лише один раз,
+    решта запитів чекають на його результат.
+
+    Якщо запит, що виконує loader, скасовано, ті, хто чекав, не скасовуються, а
+    завантажують ключ знову (один з них стає новим виконавцем).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        :return: Результат loader та ознака, чи був він отриманий від іншого запиту.
+        """
+        while (future := self._inflight.get(key)) is not None:
+            self.shared += 1
+            result = await asyncio.shield(future)
+            if result is not _LEADER_CANCELLED:
+                return result, True
+            self.shared -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        # Позначаємо виняток прочитаним, навіть якщо на нього ніхто не чекає
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+
+def jittered(ttl: float) -> float:
+    """
+    Розкидає TTL на ±CACHE_TTL_JITTER, щоб записи, створені одночасно, не закінчувались разом.
+    """
+    jitter = settings.CACHE_TTL_JITTER
+    return ttl * random.uniform(1 - jitter, 1 + jitter)
+
+
+# Спільний асинхронний клієнт Redis (кеш, FastAPILimiter). Створюється на старті застосунку;
+# поки його немає (тести, скрипти), працює лише локальний рівень кешу.
+redis_pool: Optional[redis.ConnectionPool] = None
+redis_client: Optional[redis.Redis] = None
+
+
+def init_redis() -> redis.Redis:
+    """
+    Створює спільний пул з'єднань Redis та клієнт над ним.
+    """
+    global redis_pool, redis_client
+    redis_pool = redis.ConnectionPool.from_url(
+        settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS
+    )
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    return redis_client
+
+
+async def close_redis() -> None:
+    global redis_pool, redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+    redis_pool = None
+    redis_client = None
+
+
+def redis_pool_stats() -> dict:
+    """
+    Завантаженість пулу з'єднань Redis — для підбору REDIS_MAX_CONNECTIONS.
+    """
+    if redis_pool is None:
+        return {"initialized": False}
+    in_use = len(getattr(redis_pool, "_in_use_connections", ()))
+    idle = len(getattr(redis_pool, "_available_connections", ()))
+    return {
+        "initialized": True,
+        "max_connections": redis_pool.max_connections,
+        "in_use": in_use,
+        "idle": idle,
+        "created": in_use + idle,
+    }
+
+
+# Локальний рівень кешу користувачів: обслуговує "гарячих" користувачів без звернення до Redis.
+# TTL навмисно короткий, бо інвалідація з інших воркерів сюди не доходить.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_LOCAL_MAXSIZE, ttl=settings.USER_CACHE_LOCAL_TTL)
+
+# Негативний запис: користувача з таким email немає (короткий TTL)
+MISSING = object()
+_MISSING_MARKER = b"\x00"
+
+# Версії токенів для self-contained токенів. Локальний TTL обмежує затримку відкликання
+# токенів в інших воркерах.
+token_version_cache = TTLCache(
+    maxsize=settings.USER_CACHE_LOCAL_MAXSIZE, ttl=settings.TOKEN_VERSION_LOCAL_TTL
+)
+
+
+def _user_key(email: str) -> str:
+    return f"user:{email}"
+
+
+async def get_cached_user(email: str) -> Any:
+    """
+    Повертає закешовані дані користувача: спочатку з пам'яті процесу, потім з Redis.
+
+    :return: :class:`Principal`, :data:`MISSING` для негативного запису або None, якщо в кеші нічого немає.
+    """
+    principal = user_cache.get(email)
+    if principal is not None:
+        return principal
+    if redis_client is None:
+        return None
+    try:
+        cached_user = await redis_client.get(_user_key(email))
+    except redis.RedisError as e:
+        logger.warning("User cache read failed: %s", e)
+        return None
+    if not cached_user:
+        return None
+    if cached_user == _MISSING_MARKER:
+        user_cache.set(email, MISSING, ttl=jittered(settings.USER_CACHE_NEGATIVE_TTL))
+        return MISSING
+    principal = Principal.from_bytes(cached_user)
+    if principal is None:
+        return None
+    user_cache.set(email, principal, ttl=jittered(settings.USER_CACHE_LOCAL_TTL))
+    return principal
+
+
+async def cache_user(principal: Principal) -> None:
+    """
+    Зберігає користувача (без чутливих полів) в обох рівнях кешу.
+    """
+    user_cache.set(principal.email, principal, ttl=jittered(settings.USER_CACHE_LOCAL_TTL))
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(
+            _user_key(principal.email), int(jittered(settings.USER_CACHE_TTL)), principal.to_bytes()
+        )
+    except redis.RedisError as e:
+        logger.warning("User cache write failed: %s", e)
+
+
+async def cache_missing_user(email: str) -> None:
+    """
+    Запам'ятовує, що користувача немає, щоб токени видалених користувачів не йшли щоразу в БД.
+    """
+    user_cache.set(email, MISSING, ttl=jittered(settings.USER_CACHE_NEGATIVE_TTL))
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(
+            _user_key(email), max(1, int(jittered(settings.USER_CACHE_NEGATIVE_TTL))), _MISSING_MARKER
+        )
+    except redis.RedisError as e:
+        logger.warning("User cache write failed: %s", e)
+
+
+async def invalidate_user(email: str) -> None:
+    """
+    Видаляє користувача з обох рівнів кешу. Викликається після кожної зміни користувача.
+    """
+    user_cache.pop(email)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(_user_key(email))
+    except redis.RedisError as e:
+        logger.warning("User cache invalidation failed: %s", e)
+
+
+def _token_version_key(user_id: int) -> str:
+    return f"token_version:{user_id}"
+
+
+async def get_cached_token_version(user_id: int) -> Optional[int]:
+    """
+    Повертає поточну версію токенів користувача з пам'яті процесу або з Redis.
+    """
+    version = token_version_cache.get(user_id)
+    if version is not None:
+        return version
+    if redis_client is None:
+        return None
+    try:
+        cached_version = await redis_client.get(_token_version_key(user_id))
+    except redis.RedisError as e:
+        logger.warning("Token version cache read failed: %s", e)
+        return None
+    if cached_version is None:
+        return None
+    version = int(cached_version)
+    token_version_cache.set(user_id, version, ttl=jittered(settings.TOKEN_VERSION_LOCAL_TTL))
+    return version
+
+
+async def cache_token_version(user_id: int, version: int) -> None:
+    token_version_cache.set(user_id, version, ttl=jittered(settings.TOKEN_VERSION_LOCAL_TTL))
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(
+            _token_version_key(user_id), int(jittered(settings.USER_CACHE_TTL)), version
+        )
+    except redis.RedisError as e:
+        logger.warning("Token version cache write failed: %s", e)
+
+
+async def invalidate_token_version(user_id: int) -> None:
+    """
+    Видаляє версію токенів з кешу після її зміни (скидання пароля, підтвердження email).
+    """
+    token_version_cache.pop(user_id)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(_token_version_key(user_id))
+    except redis.RedisError as e:
+        logger.warning("Token version cache invalidation failed: %s", e)
+
+
+class ResponseCache:
+    """
+    Кеш серіалізованих тіл відповідей: пам'ять процесу та Redis.
+
+    Ключ має містити версію даних, тому окрема інвалідація не потрібна: після запису
+    запити йдуть за новим ключем, а старі записи витісняються або закінчуються за TTL.
+
+    :param prefix: Префікс ключів у Redis.
+    :param ttl: Час життя запису в Redis, секунди.
+    :param local_maxsize: Кількість записів у пам'яті процесу.
+    :param local_ttl: Час життя запису в пам'яті процесу, секунди.
+    :param max_bytes: Тіла, більші за цей розмір, не кешуються.
+    """
+
+    def __init__(self, prefix: str, ttl: int, local_maxsize: int, local_ttl: int, max_bytes: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.local = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self.redis_hits = 0
+        self.misses = 0
+        self.too_large = 0
+        self.bytes_served = 0
+        self.bytes_stored = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        body = self.local.get(key)
+        if body is None and redis_client is not None:
+            try:
+                body = await redis_client.get(f"{self.prefix}:{key}")
+            except redis.RedisError as e:
+                logger.warning("Response cache read failed: %s", e)
+            if body is not None:
+                self.redis_hits += 1
+                self.local.set(key, body, ttl=jittered(self.local.ttl))
+        if body is None:
+            self.misses += 1
+            return None
+        self.bytes_served += len(body)
+        return body
+
+    async def set(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            self.too_large += 1
+            return
+        self.local.set(key, body, ttl=jittered(self.local.ttl))
+        self.bytes_stored += len(body)
+        if redis_client is None:
+            return
+        try:
+            await redis_client.setex(f"{self.prefix}:{key}", int(jittered(self.ttl)), body)
+        except redis.RedisError as e:
+            logger.warning("Response cache write failed: %s", e)
+
+    def stats(self) -> dict:
+        hits = self.local.hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "local": self.local.stats(),
+            "hits": hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "too_large": self.too_large,
+            "max_bytes": self.max_bytes,
+            "bytes_served": self.bytes_served,
+            "bytes_stored": self.bytes_stored,
+        }
+
+
+# Сторінки GET /contacts; ключ містить users.contacts_version власника
+contact_page_cache = ResponseCache(
+    "contacts_page",
+    ttl=settings.CONTACT_PAGE_CACHE_TTL,
+    local_maxsize=settings.CONTACT_PAGE_CACHE_LOCAL_MAXSIZE,
+    local_ttl=settings.CONTACT_PAGE_CACHE_LOCAL_TTL,
+    max_bytes=settings.CONTACT_PAGE_CACHE_MAX_BYTES,
+)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
@@ -10,12 +10,64 @@ class Settings(BaseSettings):
     EMAIL_PORT: int
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
+    EMAIL_USE_TLS: bool = True
+    EMAIL_SMTP_POOL_SIZE: int = 2
+    EMAIL_SMTP_TIMEOUT: float = 10.0
+    EMAIL_OUTBOX_WORKER: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 1.0
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_BACKOFF_BASE: float = 2.0
+    EMAIL_OUTBOX_BACKOFF_MAX: float = 600.0
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 60.0
     CLOUDINARY_CLOUD_NAME: str
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
     ALLOWED_ORIGINS: List[str]
+    METRICS_ALLOWED_NETWORKS: List[str] = ["127.0.0.1/32", "::1/128"]
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 50
     TEST_DATABASE_URL:str
+    USER_CACHE_TTL: int = 300
+    USER_CACHE_LOCAL_TTL: int = 30
+    USER_CACHE_LOCAL_MAXSIZE: int = 1024
+    USER_CACHE_NEGATIVE_TTL: int = 30
+    CACHE_TTL_JITTER: float = 0.1
+    TOKEN_CACHE_MAXSIZE: int = 10000
+    SELF_CONTAINED_TOKENS: bool = False
+    TOKEN_VERSION_LOCAL_TTL: int = 5
+    CONTACT_IMPORT_BATCH_SIZE: int = 1000
+    CONTACT_IMPORT_MAX_ERRORS: int = 1000
+    CONTACT_EXPORT_BATCH_SIZE: int = 1000
+    CONTACT_EXPORT_CHUNK_SIZE: int = 65536
+    CONTACT_BATCH_GET_MAX_IDS: int = 100
+    CONTACT_PAGE_CACHE_TTL: int = 300
+    CONTACT_PAGE_CACHE_LOCAL_TTL: int = 30
+    CONTACT_PAGE_CACHE_LOCAL_MAXSIZE: int = 256
+    CONTACT_PAGE_CACHE_MAX_BYTES: int = 262144
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_REPLICA_MAX_LAG_SECONDS: Optional[float] = None
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1.0
+    DB_READ_AFTER_WRITE_SECONDS: float = 5.0
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: str = "idle"
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = 30.0
+    SQL_INSTRUMENTATION: bool = False
+    SQL_REPEATED_STATEMENT_THRESHOLD: int = 3
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    AVATAR_STORAGE: str = "cloudinary"
+    AVATAR_LOCAL_DIR: str = "media/avatars"
+    AVATAR_LOCAL_BASE_URL: str = "/media/avatars"
+    AVATAR_MAX_UPLOAD_BYTES: int = 10485760
+    AVATAR_SIZE: int = 256
+    AVATAR_QUALITY: int = 85
+    AVATAR_RESIZE_WORKERS: int = 2
+    AVATAR_RESIZE_MAX_QUEUE: int = 32
+    AVATAR_MAX_CONCURRENT_UPLOADS: int = 4
 
     class Config:
         env_file = ".env"
@@ -1,41 +1,442 @@
-from sqlalchemy.orm import Session
-from typing import Optional, List
-from . import models, schemas, utils
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, column, func, insert, literal_column, select, table, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, Optional, List, Sequence, Tuple
+from . import models, schemas
 
 
-def get_user_by_token(db: Session, token: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.token == token).first()
+async def get_user_by_token(db: AsyncSession, token: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.token == token).limit(1))
 
-def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.email == email).limit(1))
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = utils.get_password_hash(user.password)
-    db_user = models.User(email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+def _supports_returning(db: AsyncSession) -> bool:
+    dialect = db.get_bind().dialect
+    return dialect.insert_returning and dialect.update_returning
+
+async def _insert_returning(db: AsyncSession, model, values: dict):
+    """
+    ``INSERT … RETURNING``: рядок разом зі значеннями з бази (id, server_default) за один запит.
+
+    Без підтримки RETURNING (SQLite < 3.35) рядок перечитується за первинним ключем.
+    """
+    stmt = insert(model).values(**values)
+    if _supports_returning(db):
+        return await db.scalar(stmt.returning(model))
+    result = await db.execute(stmt)
+    return await db.get(model, result.inserted_primary_key[0])
+
+async def _update_returning(db: AsyncSession, model, criteria: Sequence, values: dict):
+    """
+    ``UPDATE … RETURNING`` для одного рядка; None, якщо жоден рядок не відповідає ``criteria``.
+
+    Без підтримки RETURNING рядок перечитується за первинним ключем після оновлення.
+    """
+    stmt = update(model).where(*criteria).values(**values).execution_options(synchronize_session=False)
+    if _supports_returning(db):
+        return await db.scalar(stmt.returning(model).execution_options(populate_existing=True))
+    row_id = await db.scalar(select(model.id).where(*criteria).limit(1))
+    if row_id is None:
+        return None
+    await db.execute(stmt.where(model.id == row_id))
+    return await db.scalar(select(model).where(model.id == row_id).execution_options(populate_existing=True))
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str) -> models.User:
+    """
+    Створює користувача з уже обчисленим хешем пароля.
+
+    Хеш рахується заздалегідь через :func:`utils.get_password_hash_async`: синхронний bcrypt
+    тут заблокував би цикл подій.
+    """
+    db_user = await _insert_returning(db, models.User, {"email": user.email, "hashed_password": hashed_password})
+    await db.commit()
     return db_user
 
-def get_user(db: Session, user_id: int) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.id == user_id).limit(1))
+
+async def get_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    return await db.scalar(select(models.User.token_version).where(models.User.id == user_id))
+
+async def get_contacts_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    return await db.scalar(select(models.User.contacts_version).where(models.User.id == user_id))
+
+async def _bump_contacts_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """
+    Збільшує версію контактів власника і повертає нове значення для позначки змінених рядків;
+    None, якщо власника вже немає (наприклад, self-contained токен видаленого користувача).
+
+    Оновлення виконується в тій самій транзакції, що й зміна контактів: версія не може відстати
+    від даних, а блокування рядка користувача впорядковує конкурентні записи одного власника.
+    """
+    stmt = (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(contacts_version=models.User.contacts_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if _supports_returning(db):
+        return await db.scalar(stmt.returning(models.User.contacts_version))
+    await db.execute(stmt)
+    return await get_contacts_version(db, user_id)
+
+def _live_contacts(user_id: int):
+    # Контакти власника без видалених ("надгробків")
+    return select(models.Contact).where(
+        models.Contact.owner_id == user_id, models.Contact.deleted_at.is_(None)
+    )
+
+def _project(stmt, fields: Optional[Sequence[str]]):
+    # Лише потрібні колонки: рядки замість ORM-об'єктів, менше даних з БД
+    if fields is None:
+        return stmt
+    return stmt.with_only_columns(*(getattr(models.Contact, field) for field in fields))
+
+async def _fetch(db: AsyncSession, stmt, fields: Optional[Sequence[str]] = None) -> list:
+    result = await db.execute(stmt)
+    return list(result.all() if fields is not None else result.scalars().all())
+
+async def get_contacts(
+    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100, fields: Optional[Sequence[str]] = None
+) -> List[models.Contact]:
+    """
+    :param fields: Якщо задано, повертаються рядки лише з цими колонками замість ORM-об'єктів.
+    """
+    stmt = _project(_live_contacts(user_id), fields).offset(skip).limit(limit)
+    return await _fetch(db, stmt, fields)
+
+async def get_contacts_after(
+    db: AsyncSession,
+    user_id: int,
+    after: Optional[Tuple[str, int]] = None,
+    limit: int = 100,
+    fields: Optional[Sequence[str]] = None,
+) -> List[models.Contact]:
+    """
+    Keyset-пагінація: контакти, що йдуть після ``after`` у порядку (name, id).
+
+    Використовує індекс (owner_id, name, id), тому вартість сторінки не залежить від її глибини.
+
+    :param fields: Якщо задано, повертаються рядки лише з цими колонками замість ORM-об'єктів.
+    """
+    stmt = _project(_live_contacts(user_id), fields)
+    if after is not None:
+        stmt = stmt.where(tuple_(models.Contact.name, models.Contact.id) > tuple_(*after))
+    stmt = stmt.order_by(models.Contact.name, models.Contact.id).limit(limit)
+    return await _fetch(db, stmt, fields)
+
+def _fts5_query(q: str) -> Optional[str]:
+    # Кожне слово запиту стає префіксним терміном FTS5; спецсинтаксис FTS5 з запиту не пропускаємо
+    terms = re.findall(r"\w+", q)[:8]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+async def search_contacts(
+    db: AsyncSession, user_id: int, q: str, skip: int = 0, limit: int = 20
+) -> List[models.Contact]:
+    """
+    Пошук контактів власника за name, email та phone, найрелевантніші першими.
+
+    Postgres використовує триграмний індекс (збіги з початку поля вище за схожість),
+    SQLite — FTS5 з ранжуванням bm25 (name важить більше за email і phone).
+    """
+    dialect = db.get_bind().dialect.name
+    stmt = _live_contacts(user_id)
+
+    if dialect == "sqlite":
+        match = _fts5_query(q)
+        if match is None:
+            return []
+        fts = table("contacts_fts", column("rowid"))
+        stmt = (
+            stmt.join(fts, fts.c.rowid == models.Contact.id)
+            .where(literal_column("contacts_fts").match(match))
+            .order_by(func.bm25(literal_column("contacts_fts"), 10.0, 5.0, 1.0), models.Contact.id)
+        )
+    else:
+        needle = q.strip().lower()
+        if not needle:
+            return []
+        escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        # Вираз має збігатися з виразом індексу ix_contacts_search_trgm, тому пробіли — літерали, а не параметри
+        space = literal_column("' '")
+        document = func.lower(models.Contact.name + space + models.Contact.email + space + models.Contact.phone)
+        prefix_rank = case(
+            (func.lower(models.Contact.name).like(f"{escaped}%", escape="\\"), 0),
+            (func.lower(models.Contact.email).like(f"{escaped}%", escape="\\"), 1),
+            (models.Contact.phone.like(f"{escaped}%", escape="\\"), 2),
+            else_=3,
+        )
+        ranking = [prefix_rank]
+        if dialect == "postgresql":
+            ranking.append(func.similarity(document, needle).desc())
+        stmt = stmt.where(document.like(f"%{escaped}%", escape="\\")).order_by(
+            *ranking, models.Contact.name, models.Contact.id
+        )
+
+    return await _fetch(db, stmt.offset(skip).limit(limit))
+
+async def create_contact(
+    db: AsyncSession, contact: schemas.ContactCreate, user_id: int
+) -> Optional[models.Contact]:
+    """
+    :return: Створений контакт або None, якщо власника немає.
+    """
+    version = await _bump_contacts_version(db, user_id)
+    if version is None:
+        await db.rollback()
+        return None
+    db_contact = await _insert_returning(
+        db, models.Contact, {**contact.model_dump(), "owner_id": user_id, "version": version}
+    )
+    await db.commit()
+    return db_contact
+
+async def bulk_create_contacts(
+    db: AsyncSession, contacts: List[schemas.ContactCreate], user_id: int
+) -> Optional[int]:
+    """
+    Вставляє пачку контактів одним executemany-запитом без refresh кожного рядка.
+
+    :return: Кількість вставлених контактів або None, якщо власника немає.
+    """
+    if not contacts:
+        return 0
+    version = await _bump_contacts_version(db, user_id)
+    if version is None:
+        await db.rollback()
+        return None
+    await db.execute(
+        insert(models.Contact),
+        [{**contact.model_dump(), "owner_id": user_id, "version": version} for contact in contacts],
+    )
+    await db.commit()
+    return len(contacts)
+
+async def iter_contacts(db: AsyncSession, user_id: int, batch_size: int = 1000) -> AsyncIterator[tuple]:
+    """
+    Потоково віддає контакти власника рядками (id, name, phone, email) через серверний курсор.
+
+    ORM-об'єкти не створюються, а в пам'яті одночасно не більше ``batch_size`` рядків.
+    """
+    stmt = (
+        select(models.Contact.id, models.Contact.name, models.Contact.phone, models.Contact.email)
+        .where(models.Contact.owner_id == user_id, models.Contact.deleted_at.is_(None))
+        .order_by(models.Contact.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+async def get_contact(db: AsyncSession, contact_id: int, user_id: int) -> Optional[models.Contact]:
+    return await db.scalar(_live_contacts(user_id).where(models.Contact.id == contact_id).limit(1))
 
-def get_contacts(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Contact]:
-    return db.query(models.Contact).filter(models.Contact.owner_id == user_id).offset(skip).limit(limit).all()
+async def get_contacts_by_ids(db: AsyncSession, ids: List[int], user_id: int) -> List[models.Contact]:
+    """
+    Контакти власника з переданими id одним запитом ``IN``; порядок не гарантується.
+    """
+    if not ids:
+        return []
+    return await _fetch(db, _live_contacts(user_id).where(models.Contact.id.in_(ids)))
 
-def create_contact(db: Session, contact: schemas.ContactCreate, user_id: int) -> models.Contact:
-    db_contact = models.Contact(**contact.dict(), owner_id=user_id)
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+def _live_contact(contact_id: int, user_id: int) -> tuple:
+    return (
+        models.Contact.id == contact_id,
+        models.Contact.owner_id == user_id,
+        models.Contact.deleted_at.is_(None),
+    )
+
+async def update_contact(
+    db: AsyncSession, contact_id: int, contact: schemas.ContactCreate, user_id: int
+) -> Optional[models.Contact]:
+    """
+    Оновлює контакт одним ``UPDATE … RETURNING`` без попереднього SELECT та refresh.
+    Якщо контакту немає, транзакція (разом зі збільшеною версією) відкочується.
+    """
+    version = await _bump_contacts_version(db, user_id)
+    db_contact = await _update_returning(
+        db, models.Contact, _live_contact(contact_id, user_id), {**contact.model_dump(), "version": version}
+    )
+    if db_contact is None:
+        await db.rollback()
+        return None
+    await db.commit()
     return db_contact
 
-def get_contact(db: Session, contact_id: int, user_id: int) -> Optional[models.Contact]:
-    return db.query(models.Contact).filter(models.Contact.id == contact_id, models.Contact.owner_id == user_id).first()
+async def delete_contact(db: AsyncSession, contact_id: int, user_id: int) -> bool:
+    """
+    М'яке видалення: рядок стає "надгробком", який клієнти отримають через get_contact_changes.
+    """
+    version = await _bump_contacts_version(db, user_id)
+    result = await db.execute(
+        update(models.Contact)
+        .where(*_live_contact(contact_id, user_id))
+        .values(deleted_at=func.now(), version=version)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        return False
+    await db.commit()
+    return True
+
+async def get_contact_changes(
+    db: AsyncSession, user_id: int, after: Optional[Tuple[int, int]] = None, limit: int = 100
+) -> List[models.Contact]:
+    """
+    Контакти (разом із видаленими), змінені після позиції ``after`` у порядку (version, id).
+
+    Використовує індекс (owner_id, version, id): вартість синхронізації залежить від кількості
+    змін, а не від розміру адресної книги.
+    """
+    stmt = select(models.Contact).where(models.Contact.owner_id == user_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(models.Contact.version, models.Contact.id) > tuple_(*after))
+    stmt = stmt.order_by(models.Contact.version, models.Contact.id).limit(limit)
+    return await _fetch(db, stmt)
 
-def update_avatar(db: Session, user: models.User, avatar_url: str) -> models.User:
-    user.avatar_url = avatar_url
-    db.commit()
-    db.refresh(user)
+async def _update_user(db: AsyncSession, criteria: Sequence, values: dict) -> Optional[models.User]:
+    user = await _update_returning(db, models.User, criteria, values)
+    if user is None:
+        await db.rollback()
+        return None
+    await db.commit()
     return user
+
+# INSERT … ON CONFLICT DO NOTHING для діалектів, що його підтримують
+_INSERT_IGNORE = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+async def get_avatar_url(db: AsyncSession, content_hash: str) -> Optional[str]:
+    return await db.scalar(select(models.AvatarBlob.url).where(models.AvatarBlob.content_hash == content_hash))
+
+async def update_avatar(
+    db: AsyncSession, user_id: int, avatar_url: str, content_hash: Optional[str] = None
+) -> Optional[models.User]:
+    """
+    Оновлює аватар користувача.
+
+    :param content_hash: Хеш щойно завантаженого файлу: запам'ятовується разом з URL в тій самій
+        транзакції, щоб наступні завантаження того самого файлу не обробляли його знову.
+    """
+    if content_hash is not None:
+        values = {"content_hash": content_hash, "url": avatar_url}
+        dialect_insert = _INSERT_IGNORE.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            # Той самий файл могли одночасно завантажити двічі: залишається перший запис
+            await db.execute(dialect_insert(models.AvatarBlob).values(**values).on_conflict_do_nothing())
+        elif await get_avatar_url(db, content_hash) is None:
+            await db.execute(insert(models.AvatarBlob).values(**values))
+    return await _update_user(db, [models.User.id == user_id], {"avatar_url": avatar_url})
+
+async def mark_email_verified(db: AsyncSession, email: str) -> Optional[models.User]:
+    """
+    Підтверджує email одним ``UPDATE … RETURNING``.
+
+    :return: Оновленого користувача або None, якщо користувача немає чи email уже підтверджено.
+    """
+    return await _update_user(
+        db,
+        [models.User.email == email, models.User.is_verified.is_(False)],
+        # Нова версія відкликає self-contained токени зі старим is_verified
+        {"is_verified": True, "token_version": models.User.token_version + 1},
+    )
+
+async def update_password(db: AsyncSession, email: str, hashed_password: str) -> Optional[models.User]:
+    return await _update_user(
+        db,
+        [models.User.email == email],
+        {"hashed_password": hashed_password, "token_version": models.User.token_version + 1},
+    )
+
+def enqueue_email(db: AsyncSession, recipient: str, subject: str, body: str) -> models.OutboxEmail:
+    """
+    Додає лист до черги відправки в поточній транзакції; зберігає його commit того, хто викликає.
+
+    Лист з'являється в черзі лише разом з даними, через які він надсилається (наприклад, новим користувачем).
+    """
+    email = models.OutboxEmail(recipient=recipient, subject=subject, body=body)
+    db.add(email)
+    return email
+
+async def claim_outbox_emails(db: AsyncSession, limit: int, lease_seconds: float) -> List[models.OutboxEmail]:
+    """
+    Бере до ``limit`` листів, час відправки яких настав, і відкладає їх на ``lease_seconds``.
+
+    Поки лист відправляється, інші воркери його не беруть (``SKIP LOCKED`` у Postgres); якщо воркер
+    упаде, лист повернеться в чергу після закінчення оренди. Кожне взяття рахується як спроба.
+    """
+    ids = list(await db.scalars(
+        select(models.OutboxEmail.id)
+        .where(models.OutboxEmail.status == "pending", models.OutboxEmail.next_attempt_at <= func.now())
+        .order_by(models.OutboxEmail.next_attempt_at, models.OutboxEmail.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ))
+    if not ids:
+        await db.commit()
+        return []
+    stmt = (
+        update(models.OutboxEmail)
+        .where(models.OutboxEmail.id.in_(ids))
+        .values(
+            attempts=models.OutboxEmail.attempts + 1,
+            next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if _supports_returning(db):
+        emails = list(await db.scalars(stmt.returning(models.OutboxEmail).execution_options(populate_existing=True)))
+    else:
+        await db.execute(stmt)
+        emails = list(await db.scalars(
+            select(models.OutboxEmail).where(models.OutboxEmail.id.in_(ids)).execution_options(populate_existing=True)
+        ))
+    await db.commit()
+    return sorted(emails, key=lambda email: email.id)
+
+async def finish_outbox_batch(
+    db: AsyncSession, sent_ids: List[int], failures: List[Tuple[int, str, Optional[float]]]
+) -> None:
+    """
+    Записує результат відправки пачки.
+
+    :param failures: ``(id, помилка, затримка до повтору в секундах)``; затримка None — спроби вичерпано.
+    """
+    if sent_ids:
+        await db.execute(
+            update(models.OutboxEmail)
+            .where(models.OutboxEmail.id.in_(sent_ids))
+            .values(status="sent", sent_at=func.now(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    now = datetime.now(timezone.utc)
+    for email_id, error, retry_in in failures:
+        values = {"last_error": error[:1000]}
+        if retry_in is None:
+            values["status"] = "failed"
+        else:
+            values["next_attempt_at"] = now + timedelta(seconds=retry_in)
+        await db.execute(
+            update(models.OutboxEmail)
+            .where(models.OutboxEmail.id == email_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+async def count_outbox_emails(db: AsyncSession) -> Dict[str, int]:
+    """
+    Кількість листів у черзі та листів, для яких вичерпано спроби.
+    """
+    rows = await db.execute(
+        select(models.OutboxEmail.status, func.count())
+        .where(models.OutboxEmail.status.in_(("pending", "failed")))
+        .group_by(models.OutboxEmail.status)
+    )
+    return {"pending": 0, "failed": 0, **dict(rows.all())}
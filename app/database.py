@@ -1,15 +1,222 @@
-from sqlalchemy import create_engine
+import time
+from collections import deque
+from typing import Any, Optional
+
+from fastapi import Request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Асинхронні драйвери для синхронних URL з налаштувань (ті самі URL використовує Alembic)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+# Стратегії перевірки з'єднання перед видачею з пулу (DB_POOL_PRE_PING)
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+def async_database_url(url: str) -> str:
+    """
+    Перетворює ``postgresql://`` / ``sqlite://`` URL на URL з асинхронним драйвером.
+    URL, у якому вже вказано асинхронний драйвер, повертається без змін.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.get_driver_name() in ("", "psycopg2", "psycopg", "pysqlite"):
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул з'єднань, який рахує видачі з'єднань, тайм-аути та час очікування на вільне з'єднання.
+
+    Високий час очікування при ``checked_out == size + max_overflow`` означає, що затримка
+    запитів походить від нестачі з'єднань у пулі, а не від самої бази.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits = deque(maxlen=1024)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._recent_waits.append(waited)
+
+    def stats(self) -> dict:
+        """
+        Повертає завантаженість пулу та час очікування з'єднання (в мілісекундах) для ендпоінта метрик.
+        """
+        recent = sorted(self._recent_waits)
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 2)
+
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            # QueuePool рахує overflow від -size: від'ємне значення означає ще не відкриті з'єднання
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self._total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": round(self._max_wait * 1000, 2),
+        }
+
+
+def _ping_idle_connections(engine: AsyncEngine, idle_seconds: float) -> None:
+    """
+    Перевіряє ``SELECT 1`` лише ті з'єднання, що пролежали в пулі довше за ``idle_seconds``.
+
+    На відміну від ``pool_pre_ping=True`` не додає зайвий round-trip до кожного запиту
+    під навантаженням, коли з'єднання повертаються в пул і одразу видаються знову.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkin")
+    def remember_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception as error:
+            # Пул закриє це з'єднання і видасть нове
+            raise exc.DisconnectionError() from error
+
+
+def make_engine(url: str, **overrides: Any) -> AsyncEngine:
+    """
+    Створює асинхронний рушій з параметрами пулу з налаштувань ``DB_POOL_*``.
+
+    :param overrides: Замінюють окремі параметри ``create_async_engine`` (наприклад, у тестах).
+    """
+    pre_ping = overrides.pop("pre_ping", settings.DB_POOL_PRE_PING)
+    if pre_ping not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_POOL_PRE_PING must be one of {PRE_PING_STRATEGIES}, got {pre_ping!r}")
+    idle_seconds = overrides.pop("pre_ping_idle_seconds", settings.DB_POOL_PRE_PING_IDLE_SECONDS)
+    options = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": pre_ping == "always",
+        **overrides,
+    }
+    new_engine = create_async_engine(async_database_url(url), **options)
+    if pre_ping == "idle":
+        _ping_idle_connections(new_engine, idle_seconds)
+    return new_engine
+
+
+def pool_stats(db_engine: Optional[AsyncEngine] = None) -> dict:
+    """
+    Стан пулу з'єднань бази для ендпоінта метрик.
+    """
+    pool = (db_engine or engine).pool
+    if not isinstance(pool, InstrumentedPool):
+        return {"pool": type(pool).__name__, "status": pool.status()}
+    return pool.stats()
+
+
+class SessionUsage:
+    """
+    Лічильники запитів із сесією бази: скільки з них справді взяли з'єднання з пулу.
+
+    Запити, відхилені автентифікацією чи обслужені з кешу, відкривають сесію, але не з'єднання.
+    Запит рахується один раз, навіть якщо відкрив кілька сесій (запису та читання).
+    """
+
+    def __init__(self):
+        self.opened = 0
+        self.used = 0
+
+    def record(self, db: AsyncSession, request: Optional[Request] = None) -> None:
+        """
+        Враховує закриту сесію ``db``; сесії одного ``request`` дають один запис.
+        """
+        used = bool(db.sync_session.info.get(_USED))
+        if request is None:
+            self.opened += 1
+            if used:
+                self.used += 1
+            return
+        state = request.state
+        if not getattr(state, "db_session_counted", False):
+            state.db_session_counted = True
+            self.opened += 1
+        if used and not getattr(state, "db_used_counted", False):
+            state.db_used_counted = True
+            self.used += 1
+
+    def stats(self) -> dict:
+        return {
+            "opened": self.opened,
+            "used": self.used,
+            "unused": self.opened - self.used,
+            "used_ratio": round(self.used / self.opened, 4) if self.opened else 0.0,
+        }
+
+
+_USED = "db_used"
+
+
+@event.listens_for(Session, "after_begin")
+def _mark_used(session: Session, transaction, connection) -> None:
+    # Транзакція починається лише разом з видачею з'єднання, тобто під час першого запиту
+    session.info[_USED] = True
+
+
+async def release(db: AsyncSession) -> None:
+    """
+    Завершує транзакцію читання і повертає з'єднання в пул, не чекаючи кінця запиту.
+
+    Сесією можна користуватися далі: наступний запит знову візьме з'єднання з пулу.
+    """
+    if db.in_transaction():
+        await db.rollback()
+
+
+engine = make_engine(settings.DATABASE_URL)
+# expire_on_commit=False: після commit атрибути не перечитуються неявно (lazy load в async неможливий)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+session_usage = SessionUsage()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db(request: Request = None):
+    """
+    Сесія на запит. Сесія лінива: з'єднання береться з пулу під час першого запиту до бази
+    і повертається після commit/rollback, тому відхилені запити з'єднання не займають.
+    """
+    async with SessionLocal() as db:
+        try:
+            yield db
+        finally:
+            session_usage.record(db, request)
@@ -0,0 +1,135 @@
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+
+class PoolSaturatedError(Exception):
+    """
+    Черга пулу заповнена: запит відхиляється одразу, а не чекає на вільний воркер.
+    """
+
+    def __init__(self, pool_name: str):
+        super().__init__(f"{pool_name} pool is saturated")
+        self.pool_name = pool_name
+
+
+class BoundedProcessPool:
+    """
+    Пул процесів для CPU-важких задач з обмеженою чергою та метриками затримки.
+
+    Одночасно виконується не більше ``max_workers`` задач; ще ``max_queue`` можуть чекати.
+    Усе понад це відхиляється з :class:`PoolSaturatedError`.
+    Якщо ``max_workers`` дорівнює 0, задачі виконуються у звичайному пулі потоків.
+
+    :param name: Назва пулу для метрик і повідомлень про помилки.
+    :param max_workers: Кількість процесів-воркерів.
+    :param max_queue: Максимальна кількість задач, що очікують на воркер.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+        self._recent = deque(maxlen=1024)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn замість fork: дочірні процеси не успадковують потоки та з'єднання застосунку
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Виконує ``fn(*args)`` у пулі, не блокуючи цикл подій.
+
+        :raises PoolSaturatedError: Якщо всі воркери зайняті і черга заповнена.
+        """
+        if self.in_flight >= max(self.max_workers, 1) + self.max_queue:
+            self.rejected += 1
+            raise PoolSaturatedError(self.name)
+        self.in_flight += 1
+        started = time.perf_counter()
+        if self.max_workers <= 0:
+            future = asyncio.ensure_future(run_in_threadpool(fn, *args))
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), fn, *args)
+        # Місце в пулі звільняється, коли задача справді завершилась: якщо запит скасовано
+        # (клієнт відключився), процес продовжує роботу і далі займає воркер
+        future.add_done_callback(lambda f: self._finished(f, started))
+        return await asyncio.shield(future)
+
+    def _finished(self, future: asyncio.Future, started: float) -> None:
+        self.in_flight -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            # Помилки (наприклад, невалідне зображення) не враховуються в затримках успішних задач
+            self.failed += 1
+            return
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self._total_seconds += elapsed
+        self._max_seconds = max(self._max_seconds, elapsed)
+        self._recent.append(elapsed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """
+        Повертає завантаженість пулу та затримки (в мілісекундах) для ендпоінта метрик.
+        """
+        recent = sorted(self._recent)
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 2)
+
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "avg_ms": round(self._total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self._max_seconds * 1000, 2),
+        }
+
+
+# Окремий пул для bcrypt: логін-шторм не займає потоки, які обслуговують решту ендпоінтів
+password_pool = BoundedProcessPool(
+    "password_hashing",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+# Зменшення та перекодування аватарів: декодування великих зображень не блокує цикл подій
+avatar_pool = BoundedProcessPool(
+    "avatar_resize",
+    max_workers=settings.AVATAR_RESIZE_WORKERS,
+    max_queue=settings.AVATAR_RESIZE_MAX_QUEUE,
+)
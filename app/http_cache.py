@@ -0,0 +1,45 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response
+
+# Клієнт може зберігати відповідь, але має щоразу перевіряти її через If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(version: int, *parts: Any) -> str:
+    """
+    Будує слабкий ETag з версії контактів власника та параметрів запиту.
+
+    :param version: Поточне значення ``users.contacts_version``.
+    :param parts: Усе, від чого залежить тіло відповіді (власник, шлях, параметри).
+    """
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Перевіряє заголовок If-None-Match (слабке порівняння, RFC 9110 §13.1.2).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def validation_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Відповідь 304 без тіла з тими самими заголовками валідації.
+    """
+    return Response(status_code=304, headers=validation_headers(etag))
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers.update(validation_headers(etag))
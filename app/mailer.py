@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.mime.text import MIMEText
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, crud, database, models
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """
+    Пул автентифікованих SMTP-з'єднань для фонової відправки листів.
+
+    З'єднання (з STARTTLS та логіном) відкривається один раз і використовується для
+    наступних пачок. Одночасно відкрито не більше ``size`` з'єднань. Якщо з'єднання
+    простояло довше за ``idle_check_seconds``, його спершу перевіряє NOOP.
+    Методи блокуючі (smtplib), тому викликаються в пулі потоків.
+
+    :param use_tls: Виконувати STARTTLS після підключення.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 2,
+        use_tls: bool = True,
+        timeout: float = 10.0,
+        idle_check_seconds: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(size, 1)
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password)
+        except Exception:
+            _close_quietly(conn)
+            raise
+        self.connections_opened += 1
+        return conn
+
+    def _checkout(self) -> smtplib.SMTP:
+        with self._lock:
+            conn, released_at = self._idle.pop() if self._idle else (None, 0.0)
+        if conn is not None and time.monotonic() - released_at >= self.idle_check_seconds:
+            try:
+                alive = conn.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                alive = False
+            if not alive:
+                _close_quietly(conn)
+                conn = None
+        return conn if conn is not None else self._connect()
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """
+        Видає з'єднання з пулу; після помилки з'єднання закривається і в пул не повертається.
+        """
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+            except BaseException:
+                _close_quietly(conn)
+                raise
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def send_batch(self, messages: List[Tuple[int, MIMEText]]) -> Dict[int, Optional[Exception]]:
+        """
+        Відправляє листи одним з'єднанням.
+
+        :return: Для кожного ключа — None, якщо лист прийнято сервером, інакше помилка.
+        """
+        results: Dict[int, Optional[Exception]] = {}
+        try:
+            with self.connection() as conn:
+                for key, message in messages:
+                    try:
+                        conn.send_message(message)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        # Сервер відхилив лише цей лист, з'єднання придатне для наступних
+                        results[key] = e
+                    else:
+                        results[key] = None
+        except (smtplib.SMTPException, OSError) as e:
+            for key, _ in messages:
+                results.setdefault(key, e)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                _close_quietly(conn)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle), "connections_opened": self.connections_opened}
+
+
+def _close_quietly(conn: smtplib.SMTP) -> None:
+    try:
+        conn.close()
+    except OSError:
+        pass
+
+
+def _is_permanent(error: Exception) -> bool:
+    # 5xx — постійна відмова (немає такої скриньки тощо): повтор не допоможе
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def build_message(email: models.OutboxEmail) -> MIMEText:
+    msg = MIMEText(email.body)
+    msg["Subject"] = email.subject
+    msg["From"] = settings.MAIL_USERNAME
+    msg["To"] = email.recipient
+    return msg
+
+
+class OutboxWorker:
+    """
+    Фоновий воркер черги листів (таблиця ``email_outbox``).
+
+    Бере листи пачками до ``batch_size``, розподіляє пачку між з'єднаннями пулу SMTP і
+    записує результат. Невдалі листи повторюються з експоненційною затримкою
+    (``backoff_base * 2**(спроба - 1)``, не більше ``backoff_max``) до ``max_attempts`` спроб.
+    Між пачками воркер чекає ``poll_interval`` секунд або сигналу :meth:`wake`.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker,
+        smtp: SMTPPool,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        max_attempts: int = 8,
+        backoff_base: float = 2.0,
+        backoff_max: float = 600.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.sessionmaker = sessionmaker
+        self.smtp = smtp
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.pending = 0
+        self.failed = 0
+        self.sent = 0
+        self.retried = 0
+        self.given_up = 0
+
+    def backoff(self, attempts: int) -> float:
+        return cache.jittered(min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    async def run_once(self) -> int:
+        """
+        Відправляє одну пачку листів і повертає їх кількість.
+        """
+        async with self.sessionmaker() as db:
+            emails = await crud.claim_outbox_emails(db, self.batch_size, self.lease_seconds)
+        if not emails:
+            return 0
+
+        messages = [(email.id, build_message(email)) for email in emails]
+        chunks = [messages[i::self.smtp.size] for i in range(min(self.smtp.size, len(messages)))]
+        results: Dict[int, Optional[Exception]] = {}
+        for part in await asyncio.gather(*(run_in_threadpool(self.smtp.send_batch, chunk) for chunk in chunks)):
+            results.update(part)
+
+        sent_ids, failures = [], []
+        for email in emails:
+            error = results[email.id]
+            if error is None:
+                sent_ids.append(email.id)
+            elif email.attempts >= self.max_attempts or _is_permanent(error):
+                failures.append((email.id, str(error), None))
+                self.given_up += 1
+            else:
+                failures.append((email.id, str(error), self.backoff(email.attempts)))
+                self.retried += 1
+        if failures:
+            logger.warning("Email outbox: %d of %d emails failed: %s", len(failures), len(emails), failures[0][1])
+        async with self.sessionmaker() as db:
+            await crud.finish_outbox_batch(db, sent_ids, failures)
+        self.sent += len(sent_ids)
+        return len(emails)
+
+    async def refresh_depth(self) -> None:
+        async with self.sessionmaker() as db:
+            counts = await crud.count_outbox_emails(db)
+        self.pending, self.failed = counts["pending"], counts["failed"]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+                await self.refresh_depth()
+            except Exception:
+                logger.exception("Email outbox batch failed")
+                processed = 0
+            # Повна пачка — ймовірно, черга ще не порожня: беремо наступну одразу
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def wake(self) -> None:
+        """
+        Будить воркер після запису нового листа, щоб не чекати наступного опитування.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        await run_in_threadpool(self.smtp.close)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "pending": self.pending,
+            "failed": self.failed,
+            "sent": self.sent,
+            "retried": self.retried,
+            "given_up": self.given_up,
+            "smtp_pool": self.smtp.stats(),
+        }
+
+
+def queue_verification_email(db: AsyncSession, to_email: str) -> models.OutboxEmail:
+    """
+    Ставить лист підтвердження email у чергу в транзакції ``db``.
+    """
+    link = f"http://localhost:8000/auth/confirm-email?email={to_email}"
+    return crud.enqueue_email(
+        db,
+        to_email,
+        "Email Verification",
+        f"Please verify your email by clicking the following link: {link}",
+    )
+
+
+outbox_worker = OutboxWorker(
+    database.SessionLocal,
+    SMTPPool(
+        settings.EMAIL_HOST,
+        settings.EMAIL_PORT,
+        settings.MAIL_USERNAME,
+        settings.MAIL_PASSWORD,
+        size=settings.EMAIL_SMTP_POOL_SIZE,
+        use_tls=settings.EMAIL_USE_TLS,
+        timeout=settings.EMAIL_SMTP_TIMEOUT,
+    ),
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    backoff_base=settings.EMAIL_OUTBOX_BACKOFF_BASE,
+    backoff_max=settings.EMAIL_OUTBOX_BACKOFF_MAX,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+)
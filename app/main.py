@@ -1,15 +1,15 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, status
+from fastapi.responses import JSONResponse
 from .database import Base, engine
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis
 from .config import settings
 from fastapi_limiter.depends import RateLimiter
+from . import cache, mailer, replicas, sql_metrics
+from .executors import PoolSaturatedError, avatar_pool, password_pool
 
-from .routers import auth, users, contacts
-
-
-Base.metadata.create_all(bind=engine)
+from .routers import auth, users, contacts, metrics
 
 
 app = FastAPI(title="Contacts API")
@@ -22,17 +22,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Определение пользователя запроса для чтения с реплик (read-after-write)
+app.add_middleware(replicas.ReadAfterWriteMiddleware)
+# Опциональная SQL-инструментация: Server-Timing, лог запросов и поиск N+1
+if settings.SQL_INSTRUMENTATION:
+    app.add_middleware(sql_metrics.SQLInstrumentationMiddleware)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    """Быстрый отказ вместо ожидания в переполненной очереди пула"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service is busy, please retry later"},
+        headers={"Retry-After": "1"},
+    )
+
 
 @app.on_event("startup")
 async def startup():
-    """Инициализация FastAPI-Limiter с Redis"""
-    redis_client = redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        decode_responses=True
-    )
+    """Создание таблиц и инициализация общего пула Redis для кеша и FastAPI-Limiter"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    redis_client = cache.init_redis()
     await FastAPILimiter.init(redis_client)
+    if settings.EMAIL_OUTBOX_WORKER:
+        mailer.outbox_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await mailer.outbox_worker.stop()
+    await cache.close_redis()
+    password_pool.shutdown()
+    avatar_pool.shutdown()
+    await replicas.router.dispose()
+    await engine.dispose()
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(contacts.router)
+app.include_router(metrics.router)
+
+# Локальное хранилище аватаров (разработка): файлы отдаются самим приложением
+if settings.AVATAR_STORAGE == "local":
+    app.mount(
+        settings.AVATAR_LOCAL_BASE_URL,
+        StaticFiles(directory=settings.AVATAR_LOCAL_DIR, check_dir=False),
+        name="avatars",
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, DDL, event, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -12,6 +12,9 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     avatar_url = Column(String, nullable=True)
     token = Column(String, unique=True, nullable=True)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Зростає при кожній зміні контактів користувача; з неї будуються ETag списків контактів
+    contacts_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     contacts = relationship("Contact", back_populates="owner")
 
@@ -23,5 +26,86 @@ class Contact(Base):
     phone = Column(String, nullable=False)
     email = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    # Видалений контакт лишається "надгробком", щоб GET /contacts/changes повідомив про видалення
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    # users.contacts_version на момент останньої зміни рядка — курсор синхронізації
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     owner = relationship("User", back_populates="contacts")
+
+    __table_args__ = (
+        # Keyset-пагінація GET /contacts у порядку (name, id) в межах власника
+        Index("ix_contacts_owner_name_id", "owner_id", "name", "id"),
+        # Дельта-синхронізація GET /contacts/changes у порядку (version, id) в межах власника
+        Index("ix_contacts_owner_version_id", "owner_id", "version", "id"),
+    )
+
+class OutboxEmail(Base):
+    """
+    Лист у черзі на відправку: записується в транзакції запиту, відправляє фоновий воркер.
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    # pending — чекає на відправку (або повтор), sent — відправлено, failed — спроби вичерпано
+    status = Column(String, nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Воркер вибирає листи, час яких настав, у порядку черги
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class AvatarBlob(Base):
+    """
+    Завантажене у сховище зображення аватара за SHA-256 вихідного файлу: повторне
+    завантаження того самого файлу бере готовий URL без обробки й вивантаження.
+    """
+    __tablename__ = "avatar_blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    url = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# Індекси для пошуку контактів (GET /contacts/search), які не описуються через Index:
+# у Postgres — триграмний GIN-індекс по name/email/phone, у SQLite — FTS5-таблиця з тригерами.
+# Для баз, створених міграціями, те саме робить ревізія 0004.
+CONTACT_SEARCH_DDL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE EXTENSION IF NOT EXISTS btree_gin",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts "
+        "USING gin (owner_id, lower(name || ' ' || email || ' ' || phone) gin_trgm_ops)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+        "name, email, phone, content='contacts', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+        "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_fts(contacts_fts, rowid, name, email, phone) "
+        "VALUES ('delete', old.id, old.name, old.email, old.phone); END",
+        "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+        "INSERT INTO contacts_fts(contacts_fts, rowid, name, email, phone) "
+        "VALUES ('delete', old.id, old.name, old.email, old.phone); "
+        "INSERT INTO contacts_fts(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+    ],
+}
+
+for _dialect, _statements in CONTACT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(
+    Contact.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite")
+)
@@ -0,0 +1,96 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+# Формат запису в Redis: версія формату, id, token_version, прапорці, далі email та avatar_url
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("!BqqB")
+_LENGTH = struct.Struct("!H")
+
+_IS_ACTIVE = 0b001
+_IS_VERIFIED = 0b010
+_HAS_AVATAR = 0b100
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Автентифікований користувач для обробки запиту.
+
+    Незмінний і компактний, на відміну від ORM-моделі ``User``: один екземпляр можна
+    безпечно ділити між запитами та зберігати в кеші процесу.
+    """
+
+    id: int
+    email: str
+    is_active: bool
+    is_verified: bool
+    avatar_url: Optional[str] = None
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=bool(user.is_active),
+            is_verified=bool(user.is_verified),
+            avatar_url=user.avatar_url,
+            token_version=user.token_version or 0,
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Компактне бінарне представлення для Redis (без JSON-парсингу при читанні).
+        """
+        flags = (
+            (_IS_ACTIVE if self.is_active else 0)
+            | (_IS_VERIFIED if self.is_verified else 0)
+            | (_HAS_AVATAR if self.avatar_url is not None else 0)
+        )
+        email = self.email.encode()
+        parts = [
+            _HEADER.pack(_FORMAT_VERSION, self.id, self.token_version, flags),
+            _LENGTH.pack(len(email)),
+            email,
+        ]
+        if self.avatar_url is not None:
+            avatar_url = self.avatar_url.encode()
+            parts += [_LENGTH.pack(len(avatar_url)), avatar_url]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Optional["Principal"]:
+        """
+        Відновлює Principal із :meth:`to_bytes`; для даних іншого формату, обрізаних
+        чи пошкоджених даних повертає None (запис у кеші вважається відсутнім).
+        """
+        if len(data) < _HEADER.size or data[0] != _FORMAT_VERSION:
+            return None
+        _, user_id, token_version, flags = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        try:
+            email, offset = _read_string(data, offset)
+            avatar_url = None
+            if flags & _HAS_AVATAR:
+                avatar_url, offset = _read_string(data, offset)
+        except (struct.error, UnicodeDecodeError, ValueError):
+            return None
+        if offset != len(data):
+            return None
+        return cls(
+            id=user_id,
+            email=email,
+            is_active=bool(flags & _IS_ACTIVE),
+            is_verified=bool(flags & _IS_VERIFIED),
+            avatar_url=avatar_url,
+            token_version=token_version,
+        )
+
+
+def _read_string(data: bytes, offset: int):
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    if offset + length > len(data):
+        raise ValueError("Declared length exceeds the payload")
+    return data[offset:offset + length].decode(), offset + length
@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+import redis.asyncio as redis
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from . import cache, database, models, utils
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Користувач поточного запиту ("user:<email>"): його записи прив'язують читання до основної бази
+_client_scope: ContextVar[Optional[str]] = ContextVar("replica_client_scope", default=None)
+
+# Запит стану реплікації Postgres: 0, якщо репліка програла весь отриманий WAL
+_PG_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def user_scope(email: str) -> str:
+    return f"user:{email}"
+
+
+class Replica:
+    """
+    Репліка для читання: власний рушій з пулом з'єднань і відставання від основної бази.
+
+    :param engine: Асинхронний рушій репліки.
+    :param lag_check_interval: Як часто (секунди) перевіряти відставання.
+    """
+
+    def __init__(self, engine: AsyncEngine, lag_check_interval: float = 1.0):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        self.lag_check_interval = lag_check_interval
+        # None — відставання невідоме (репліка недоступна)
+        self.lag: Optional[float] = 0.0
+        self._checked_at = float("-inf")
+        self.reads = 0
+
+    async def current_lag(self) -> Optional[float]:
+        """
+        Повертає відставання в секундах, перевіряючи його не частіше за ``lag_check_interval``.
+        """
+        if time.monotonic() - self._checked_at < self.lag_check_interval:
+            return self.lag
+        # Конкурентні запити не чекають на перевірку, а беруть попереднє значення
+        self._checked_at = time.monotonic()
+        try:
+            async with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(await conn.scalar(_PG_LAG_QUERY))
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception as e:
+            logger.warning("Replica lag check failed: %s", e)
+            self.lag = None
+        return self.lag
+
+    def stats(self) -> dict:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "lag_seconds": self.lag,
+            "reads": self.reads,
+            "pool": database.pool_stats(self.engine),
+        }
+
+
+class ReplicaRouter:
+    """
+    Вибирає базу для сесій читання: репліку по колу або основну базу.
+
+    Читання йде в основну базу, якщо немає реплік, жодна репліка не вкладається в
+    ``max_lag`` (обмежена застарілість) або користувач записував дані протягом
+    останніх ``read_after_write`` секунд — так він завжди бачить власні зміни.
+
+    :param replicas: Репліки для читання.
+    :param primary: Фабрика сесій основної бази.
+    :param max_lag: Максимально допустиме відставання репліки, секунди (None — не перевіряти).
+    :param read_after_write: Скільки секунд після запису читання користувача йдуть в основну базу.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        primary: async_sessionmaker,
+        max_lag: Optional[float] = None,
+        read_after_write: float = 5.0,
+    ):
+        self.replicas = replicas
+        self.primary = primary
+        self.max_lag = max_lag
+        self.read_after_write = read_after_write
+        # Прив'язки в пам'яті процесу; Redis поширює їх на інші воркери
+        self._pins = cache.TTLCache(maxsize=settings.USER_CACHE_LOCAL_MAXSIZE, ttl=read_after_write)
+        self._next = itertools.count()
+        self._pending_pins: set = set()
+        self.primary_reads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pin(self, scope: str) -> None:
+        """
+        Прив'язує читання ``scope`` до основної бази на ``read_after_write`` секунд.
+
+        Викликається синхронно з події after_commit, тому запис у Redis виконується окремою задачею.
+        """
+        self._pins.set(scope, True)
+        if cache.redis_client is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._pin_remote(scope))
+        except RuntimeError:
+            return
+        self._pending_pins.add(task)
+        task.add_done_callback(self._pending_pins.discard)
+
+    async def _pin_remote(self, scope: str) -> None:
+        try:
+            await cache.redis_client.set(f"primary:{scope}", 1, px=max(1, int(self.read_after_write * 1000)))
+        except redis.RedisError as e:
+            logger.warning("Read-after-write pin failed: %s", e)
+
+    async def is_pinned(self, scope: str) -> bool:
+        if self._pins.get(scope):
+            return True
+        if cache.redis_client is None:
+            return False
+        try:
+            return bool(await cache.redis_client.exists(f"primary:{scope}"))
+        except redis.RedisError as e:
+            # Без Redis не знаємо про записи в інших воркерах: безпечніше читати з основної бази
+            logger.warning("Read-after-write pin check failed: %s", e)
+            return True
+
+    async def pick(self) -> Optional[Replica]:
+        """
+        Наступна по колу репліка з допустимим відставанням або None.
+        """
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self.max_lag is None:
+                return replica
+            lag = await replica.current_lag()
+            if lag is not None and lag <= self.max_lag:
+                return replica
+        return None
+
+    async def sessionmaker_for(self, scope: Optional[str]) -> async_sessionmaker:
+        """
+        Фабрика сесій для читань клієнта ``scope``.
+        """
+        if not self.replicas:
+            return self.primary
+        replica = None
+        if scope is None or not await self.is_pinned(scope):
+            replica = await self.pick()
+        if replica is None:
+            self.primary_reads += 1
+            return self.primary
+        replica.reads += 1
+        return replica.sessionmaker
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "primary_reads": self.primary_reads,
+            "pinned": len(self._pins),
+        }
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+router = ReplicaRouter(
+    [
+        Replica(database.make_engine(url), lag_check_interval=settings.DB_REPLICA_LAG_CHECK_INTERVAL)
+        for url in settings.DATABASE_REPLICA_URLS
+    ],
+    primary=database.SessionLocal,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    read_after_write=settings.DB_READ_AFTER_WRITE_SECONDS,
+)
+
+
+async def get_read_db(request: Request = None):
+    """
+    Сесія для обробників, які лише читають: репліка, якщо вона може обслужити запит.
+    """
+    sessionmaker = await router.sessionmaker_for(_client_scope.get())
+    async with sessionmaker() as db:
+        try:
+            yield db
+        finally:
+            database.session_usage.record(db, request)
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_after_commit(session: Session) -> None:
+    if not router.enabled:
+        return
+    # Користувачі, завантажені сесією запису (зокрема з UPDATE … RETURNING): їхні зміни
+    # (підтвердження email, пароль, аватар) читаються з основної бази навіть без їхнього токена
+    scopes = {user_scope(obj.email) for obj in session.identity_map.values() if isinstance(obj, models.User)}
+    client = _client_scope.get()
+    if client is not None:
+        scopes.add(client)
+    for scope in scopes:
+        router.pin(scope)
+
+
+class ReadAfterWriteMiddleware:
+    """
+    ASGI-middleware, що визначає користувача запиту за bearer-токеном для маршрутизації читань.
+
+    Токен декодується через кеш :func:`utils.decode_access_token`, тому автентифікація
+    в обробнику не декодує його вдруге.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not router.enabled:
+            await self.app(scope, receive, send)
+            return
+        token = _client_scope.set(_request_scope(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client_scope.reset(token)
+
+
+def _request_scope(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            kind, _, credentials = value.decode("latin-1").partition(" ")
+            if kind.lower() != "bearer" or not credentials:
+                return None
+            payload = utils.decode_access_token(credentials)
+            if payload is None or "sub" not in payload:
+                return None
+            return user_scope(payload["sub"])
+    return None
@@ -1,58 +1,409 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from typing import List
+import csv
+import io
+import json
+import time
+import zlib
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Union
 
-from ..database import get_db
-from .. import models, schemas, crud
+from ..auth import get_current_principal
 from ..config import settings
-from jose import JWTError, jwt
+from ..database import get_db
+from ..principal import Principal
+from ..replicas import get_read_db
+from .. import cache, schemas, crud, http_cache, serialization, utils
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+async def _contacts_etag(request: Request, db: AsyncSession, user_id: int) -> str:
+    # The ETag changes with the owner's contacts version and with any query parameter
+    version = await crud.get_contacts_version(db, user_id) or 0
+    return http_cache.make_etag(version, user_id, request.url.path, sorted(request.query_params.multi_items()))
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(status_code=401, detail="Invalid credentials")
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
-    return user
+async def _check_not_modified(
+    request: Request, response: Response, db: AsyncSession, user_id: int
+) -> Optional[Response]:
+    """
+    Reads the owner's contacts version and answers ``304`` if the client's ETag is current.
+    Otherwise sets ``ETag`` on ``response`` and returns None so the route runs its query.
+    """
+    etag = await _contacts_etag(request, db, user_id)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+    return None
 
 @router.post("/", response_model=schemas.ContactResponse, status_code=201)
-def create_contact(
+async def create_contact(
     contact: schemas.ContactCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    db_contact = await crud.create_contact(db, contact, current_user.id)
+    if db_contact is None:
+        # The owner is gone (e.g. a self-contained token outlived the account)
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_contact
+
+def _import_format(file: UploadFile, requested: Optional[str]) -> str:
+    if requested:
+        return requested
+    content_type = (file.content_type or "").lower()
+    filename = (file.filename or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    raise HTTPException(status_code=400, detail="Unsupported import format, use CSV or NDJSON")
+
+def _iter_import_rows(file: UploadFile, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yields ``(row_number, raw_row)`` while reading the upload line by line.
+    A row that cannot be parsed is yielded as an exception instance.
+    """
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    # Row 1 of a CSV file is the header
+    rows = enumerate(csv.DictReader(text), start=2) if fmt == "csv" else enumerate(text, start=1)
+    row_number = 0
+    try:
+        while True:
+            try:
+                row_number, row = next(rows)
+            except StopIteration:
+                break
+            except (UnicodeDecodeError, csv.Error) as e:
+                # The rest of the stream cannot be read reliably
+                yield row_number + 1, e
+                break
+            if fmt == "csv":
+                yield row_number, row
+            elif row.strip():
+                try:
+                    yield row_number, json.loads(row)
+                except ValueError as e:
+                    yield row_number, e
+    finally:
+        # The upload is closed by FastAPI, not by the wrapper
+        text.detach()
+
+def _read_import_batch(
+    rows: Iterator[Tuple[int, object]], errors: List[schemas.ContactImportError]
+) -> Tuple[List[schemas.ContactCreate], int, bool]:
+    """
+    Parses and validates rows until a full batch is collected or the upload ends.
+    Runs in the threadpool: reading the spooled upload and ``EmailStr`` validation block.
+
+    Row errors are appended to ``errors`` (at most ``CONTACT_IMPORT_MAX_ERRORS``).
+    Returns the valid contacts, the number of failed rows and whether the upload is exhausted.
+    """
+    batch: List[schemas.ContactCreate] = []
+    failed = 0
+    for row_number, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append(schemas.ContactCreate.model_validate(row))
+        except (ValueError, csv.Error) as e:
+            failed += 1
+            if len(errors) < settings.CONTACT_IMPORT_MAX_ERRORS:
+                if isinstance(e, ValidationError):
+                    messages = [f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors()]
+                else:
+                    messages = [str(e)]
+                errors.append(schemas.ContactImportError(row=row_number, errors=messages))
+            continue
+        if len(batch) >= settings.CONTACT_IMPORT_BATCH_SIZE:
+            return batch, failed, False
+    return batch, failed, True
+
+@router.post("/import", response_model=schemas.ContactImportResult)
+async def import_contacts(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Bulk import of contacts from a CSV (with a ``name,phone,email`` header) or NDJSON upload.
+
+    Rows are validated with ``ContactCreate`` and inserted in batches of
+    ``CONTACT_IMPORT_BATCH_SIZE``; invalid rows are skipped and reported individually.
+    """
+    fmt = _import_format(file, format)
+    started = time.perf_counter()
+    imported = failed = 0
+    errors: List[schemas.ContactImportError] = []
+
+    rows = _iter_import_rows(file, fmt)
+    exhausted = False
+    while not exhausted:
+        batch, batch_failed, exhausted = await run_in_threadpool(_read_import_batch, rows, errors)
+        failed += batch_failed
+        inserted = await crud.bulk_create_contacts(db, batch, current_user.id)
+        if inserted is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        imported += inserted
+
+    elapsed = time.perf_counter() - started
+    return schemas.ContactImportResult(
+        imported=imported,
+        failed=failed,
+        errors=errors,
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round((imported + failed) / elapsed, 1) if elapsed else 0.0,
+    )
+
+_EXPORT_COLUMNS = ("id", "name", "phone", "email")
+_EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def _export_chunks(rows: AsyncIterator[tuple], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Serializes rows and yields them in chunks of about ``CONTACT_EXPORT_CHUNK_SIZE`` bytes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(_EXPORT_COLUMNS)
+    async for row in rows:
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(_EXPORT_COLUMNS, row)), ensure_ascii=False))
+            buffer.write("\n")
+        if buffer.tell() >= settings.CONTACT_EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+@router.get("/export")
+async def export_contacts(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    return crud.create_contact(db, contact, current_user.id)
+    """
+    Streams all of the caller's contacts as NDJSON or CSV (``id,name,phone,email``),
+    optionally gzip-compressed.
+
+    Rows are fetched from a server-side cursor in batches of ``CONTACT_EXPORT_BATCH_SIZE``,
+    so memory use does not grow with the size of the address book. The session from
+    ``get_read_db`` is closed only after the response has been sent.
+    """
+    rows = crud.iter_contacts(db, current_user.id, batch_size=settings.CONTACT_EXPORT_BATCH_SIZE)
+    chunks = _export_chunks(rows, format)
+    headers = {"Content-Disposition": f'attachment; filename="contacts.{format}"'}
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=_EXPORT_MEDIA_TYPES[format], headers=headers)
+
+_contact_serializer = serialization.Serializer.for_model(schemas.ContactResponse)
+_contact_change_serializer = serialization.Serializer.for_model(schemas.ContactChange)
+
+_CONTACT_FIELDS = tuple(schemas.ContactResponse.model_fields)
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in _CONTACT_FIELDS]
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=400, detail=f"fields must be a subset of {','.join(_CONTACT_FIELDS)}"
+        )
+    return requested
 
-@router.get("/", response_model=List[schemas.ContactResponse])
-def read_contacts(
+async def _render_contacts_page(
+    db: AsyncSession, user_id: int, skip: int, limit: int, cursor: Optional[str], fields: Optional[List[str]]
+) -> bytes:
+    serializer = serialization.Serializer(fields) if fields else _contact_serializer
+    if cursor is None:
+        contacts = await crud.get_contacts(db, user_id=user_id, skip=skip, limit=limit, fields=fields)
+        return serialization.dumps(serializer.to_list(contacts))
+
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    after = None
+    if cursor:
+        after = utils.decode_cursor(cursor)
+        if after is None or len(after) != 2 or not isinstance(after[0], str) or not isinstance(after[1], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The next cursor is built from (name, id), so those columns are always selected
+    selected = list(dict.fromkeys([*fields, "name", "id"])) if fields else None
+    # One extra row tells whether there is a next page
+    contacts = await crud.get_contacts_after(db, user_id=user_id, after=after, limit=limit + 1, fields=selected)
+    next_cursor = None
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        next_cursor = utils.encode_cursor([contacts[-1].name, contacts[-1].id])
+    return serialization.dumps({"items": serializer.to_list(contacts), "next_cursor": next_cursor})
+
+@router.get("/", response_model=Union[schemas.ContactPage, List[schemas.ContactResponse]])
+async def read_contacts(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Without ``cursor`` returns a plain list paginated by ``skip``/``limit`` (legacy behaviour).
+    With ``cursor`` (empty for the first page) returns a ``ContactPage`` ordered by name
+    and an opaque ``next_cursor`` for the following page.
+
+    ``fields=id,name`` limits every item to the listed fields; only those columns are selected.
+    Rows are serialized straight to JSON bytes with orjson, without ``response_model`` validation.
+
+    Responses carry an ``ETag``; a matching ``If-None-Match`` gets ``304 Not Modified``.
+    Serialized pages are cached under the same ETag, so any contact write makes them unreachable.
+    """
+    selected_fields = _parse_fields(fields)
+    etag = await _contacts_etag(request, db, current_user.id)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return http_cache.not_modified(etag)
+    key = f"{current_user.id}:{etag}"
+    body = await cache.contact_page_cache.get(key)
+    if body is None:
+        body = await _render_contacts_page(db, current_user.id, skip, limit, cursor, selected_fields)
+        await cache.contact_page_cache.set(key, body)
+    return Response(body, media_type="application/json", headers=http_cache.validation_headers(etag))
+
+@router.get("/search", response_model=List[schemas.ContactResponse])
+async def search_contacts(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Ranked search over the caller's contacts by name, email and phone (prefix and substring).
+    """
+    etag = await _contacts_etag(request, db, current_user.id)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return http_cache.not_modified(etag)
+    contacts = await crud.search_contacts(db, user_id=current_user.id, q=q, skip=skip, limit=limit)
+    return serialization.json_response(
+        _contact_serializer.to_list(contacts), headers=http_cache.validation_headers(etag)
+    )
+
+@router.post("/batch-get", response_model=schemas.ContactBatchGetResponse)
+async def batch_get_contacts(
+    batch: schemas.ContactBatchGetRequest,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Resolves up to ``CONTACT_BATCH_GET_MAX_IDS`` contact ids with a single query.
+
+    Contacts come back in request order (duplicates collapsed); ids that do not exist
+    or belong to another user are listed in ``missing``.
+    """
+    ids = list(dict.fromkeys(batch.ids))
+    if len(ids) > settings.CONTACT_BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.CONTACT_BATCH_GET_MAX_IDS} ids per request"
+        )
+    found = {contact.id: contact for contact in await crud.get_contacts_by_ids(db, ids, current_user.id)}
+    return serialization.json_response({
+        "contacts": _contact_serializer.to_list(found[contact_id] for contact_id in ids if contact_id in found),
+        "missing": [contact_id for contact_id in ids if contact_id not in found],
+    })
+
+@router.get("/changes", response_model=schemas.ContactChanges)
+async def read_contact_changes(
+    request: Request,
+    since: str = "",
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    return crud.get_contacts(db, user_id=current_user.id, skip=skip, limit=limit)
+    """
+    Contacts created, updated or deleted after ``since`` (empty for a full sync).
+
+    Deleted contacts are returned with ``deleted_at`` set. Store ``next_cursor`` and pass
+    it as ``since`` on the next call; while ``has_more`` is true, keep calling right away.
+    """
+    etag = await _contacts_etag(request, db, current_user.id)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return http_cache.not_modified(etag)
+    after = None
+    if since:
+        after = utils.decode_cursor(since)
+        if after is None or len(after) != 2 or not all(isinstance(v, int) for v in after):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    changes = await crud.get_contact_changes(db, user_id=current_user.id, after=after, limit=limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        next_cursor = utils.encode_cursor([changes[-1].version, changes[-1].id])
+    else:
+        next_cursor = since or utils.encode_cursor([0, 0])
+    return serialization.json_response(
+        {"changes": _contact_change_serializer.to_list(changes), "next_cursor": next_cursor, "has_more": has_more},
+        headers=http_cache.validation_headers(etag),
+    )
 
 @router.get("/{contact_id}", response_model=schemas.ContactResponse)
-def read_contact(
+async def read_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    contact = crud.get_contact(db, contact_id, current_user.id)
+    # A matching version ETag answers 304 without the contact query; "If-None-Match: *"
+    # matches only an existing representation, so it is checked after the lookup
+    wildcard = request.headers.get("if-none-match", "").strip() == "*"
+    if not wildcard:
+        not_modified = await _check_not_modified(request, response, db, current_user.id)
+        if not_modified is not None:
+            return not_modified
+    contact = await crud.get_contact(db, contact_id, current_user.id)
     if not contact:
         raise HTTPException(status_code=404, detail="Not found")
+    if wildcard:
+        not_modified = await _check_not_modified(request, response, db, current_user.id)
+        if not_modified is not None:
+            return not_modified
     return contact
+
+@router.put("/{contact_id}", response_model=schemas.ContactResponse)
+async def update_contact(
+    contact_id: int,
+    contact: schemas.ContactCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    db_contact = await crud.update_contact(db, contact_id, contact, current_user.id)
+    if not db_contact:
+        raise HTTPException(status_code=404, detail="Not found")
+    return db_contact
+
+@router.delete("/{contact_id}", status_code=204)
+async def delete_contact(
+    contact_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    if not await crud.delete_contact(db, contact_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Not found")
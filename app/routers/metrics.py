@@ -0,0 +1,47 @@
+import ipaddress
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from .. import auth, avatars, cache, database, mailer, replicas, utils
+from ..config import settings
+from ..executors import avatar_pool, password_pool
+
+
+def require_internal_client(request: Request) -> None:
+    """
+    Пускає до метрик лише клієнтів з мереж METRICS_ALLOWED_NETWORKS (за замовчуванням — localhost).
+
+    За reverse proxy адреса клієнта береться з X-Forwarded-For лише тоді, коли uvicorn
+    запущено з ``--proxy-headers`` і довіреним ``--forwarded-allow-ips``.
+    """
+    try:
+        address = ipaddress.ip_address(request.client.host if request.client else "")
+    except ValueError:
+        address = None
+    networks = [ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_NETWORKS]
+    if address is None or not any(address in network for network in networks):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(require_internal_client)])
+
+
+@router.get("/")
+def read_metrics():
+    """
+    Службові метрики процесу: кеші, пули з'єднань та воркерів.
+    """
+    return {
+        "token_cache": utils.token_cache.stats(),
+        "user_cache": cache.user_cache.stats(),
+        "contact_page_cache": cache.contact_page_cache.stats(),
+        "user_loads_coalesced": auth.user_loads.shared,
+        "db_pool": database.pool_stats(),
+        "db_sessions": database.session_usage.stats(),
+        "db_replicas": replicas.router.stats(),
+        "redis_pool": cache.redis_pool_stats(),
+        "password_pool": password_pool.stats(),
+        "email_outbox": mailer.outbox_worker.stats(),
+        "avatar_pool": avatar_pool.stats(),
+        "avatars": avatars.pipeline.stats(),
+    }
@@ -4,9 +4,9 @@ import json
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import crud, models, utils
+from app import cache, crud, models, utils
 from app.config import settings
 from app.database import get_db
 
@@ -32,16 +32,16 @@ def create_password_reset_token(email: str) -> str:
     return token
 
 @router.post("/request-password-reset", status_code=200)
-def request_password_reset(
+async def request_password_reset(
     request_data: PasswordResetRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Ендпоінт для запиту скидання пароля.
     Якщо користувача з вказаним email не існує, повертаємо успішну відповідь для захисту даних.
     У разі успіху генеруємо токен та відправляємо посилання для скидання (тут просто виводимо в консоль).
     """
-    user = crud.get_user_by_email(db, email=request_data.email)
+    user = await crud.get_user_by_email(db, email=request_data.email)
     # Для безпеки завжди повертаємо позитивну відповідь, навіть якщо користувача не знайдено
     if not user:
         return {"message": "Якщо акаунт з таким email існує, на нього відправлено лист для скидання пароля."}
@@ -55,10 +55,10 @@ def request_password_reset(
     return {"message": "Якщо акаунт з таким email існує, на нього відправлено лист для скидання пароля."}
 
 @router.post("/reset-password", status_code=200)
-def reset_password(
+async def reset_password(
     token: str = Query(..., description="Токен для скидання пароля"),
     reset_data: PasswordReset = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Ендпоінт для скидання пароля.
@@ -73,13 +73,11 @@ def reset_password(
     except JWTError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Недійсний токен")
 
-    user = crud.get_user_by_email(db, email=email)
-    if not user:
+    # Хешуємо новий пароль та оновлюємо користувача одним UPDATE … RETURNING
+    hashed_password = await utils.get_password_hash_async(reset_data.new_password)
+    user = await crud.update_password(db, email, hashed_password)
+    if user is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Користувача не знайдено")
-
-    # Хешуємо новий пароль та оновлюємо користувача
-    hashed_password = utils.get_password_hash(reset_data.new_password)
-    user.hashed_password = hashed_password
-    db.commit()
-    db.refresh(user)
+    await cache.invalidate_user(user.email)
+    await cache.invalidate_token_version(user.id)
     return {"message": "Пароль успішно скинуто."}
@@ -1,41 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from typing import Optional
-import cloudinary
-import cloudinary.uploader
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, Optional
 
+from ..auth import get_current_user
 from ..database import get_db
-from .. import crud, models, schemas
-from ..config import settings
+from ..principal import Principal
+from .. import avatars, cache, crud, schemas
 
-router = APIRouter(prefix="/users", tags=["users"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# Multipart boundaries and part headers sent on top of the file itself
+_MULTIPART_OVERHEAD = 16384
 
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
 
+class UploadSizeLimitRoute(APIRoute):
+    """
+    Answers ``413`` when ``Content-Length`` already exceeds the avatar size limit,
+    before FastAPI reads and spools the multipart body. Bodies without a length
+    are still checked by the avatar pipeline once spooled.
+    """
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    user = crud.get_user_by_token(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    return user
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            length = request.headers.get("content-length", "")
+            if length.isdigit() and int(length) > avatars.pipeline.max_upload_bytes + _MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="Image is too large")
+            return await handler(request)
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/users", tags=["users"], route_class=UploadSizeLimitRoute)
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 @router.post("/me/avatar", response_model=schemas.UserResponse)
-def update_avatar(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def update_avatar(file: UploadFile = File(...), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Invalid image type")
-    upload_result = cloudinary.uploader.upload(file.file)
-    avatar_url = upload_result.get("secure_url")
-    if not avatar_url:
+    try:
+        avatar_url, content_hash = await avatars.pipeline.store(db, file.file)
+    except avatars.UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    except avatars.InvalidImageError:
+        raise HTTPException(status_code=400, detail="Invalid image")
+    except avatars.AvatarStorageError:
         raise HTTPException(status_code=500, detail="Failed to upload image")
-    updated_user = crud.update_avatar(db, current_user, avatar_url)
+    # current_user може бути відновлений з кешу, тому оновлюємо рядок за id і отримуємо його через RETURNING
+    updated_user = await crud.update_avatar(db, current_user.id, avatar_url, content_hash=content_hash)
+    if updated_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    await cache.invalidate_user(updated_user.email)
     return updated_user
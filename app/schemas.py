@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 
@@ -38,5 +39,36 @@ class ContactResponse(ContactBase):
     class Config:
         from_attributes = True
 
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+class ContactBatchGetRequest(BaseModel):
+    ids: List[int]
+
+class ContactBatchGetResponse(BaseModel):
+    contacts: List[ContactResponse]
+    missing: List[int]
+
+class ContactChange(ContactResponse):
+    updated_at: datetime
+    deleted_at: Optional[datetime] = None
+
+class ContactChanges(BaseModel):
+    changes: List[ContactChange]
+    next_cursor: str
+    has_more: bool
+
+class ContactImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class ContactImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ContactImportError]
+    elapsed_seconds: float
+    rows_per_second: float
+
 class UpdateAvatar(BaseModel):
     avatar: str
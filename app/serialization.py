@@ -0,0 +1,49 @@
+from operator import attrgetter
+from typing import Any, Iterable, List, Optional, Sequence, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+
+class Serializer:
+    """
+    Заздалегідь зібраний серіалізатор ORM-об'єктів (або рядків запиту) у словники полів схеми.
+
+    На відміну від ``response_model``, значення не проходять повторну валідацію Pydantic
+    (перевірка ``EmailStr`` — найдорожча частина відповіді): вони вже були перевірені під час запису.
+
+    :param fields: Назви атрибутів, які потрапляють у відповідь, у потрібному порядку.
+    """
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = tuple(fields)
+        getter = attrgetter(*self.fields)
+        # attrgetter з одним полем повертає значення, а не кортеж
+        self._values = (lambda obj: (getter(obj),)) if len(self.fields) == 1 else getter
+
+    @classmethod
+    def for_model(cls, model: Type[BaseModel]) -> "Serializer":
+        return cls(tuple(model.model_fields))
+
+    def to_dict(self, obj: Any) -> dict:
+        return dict(zip(self.fields, self._values(obj)))
+
+    def to_list(self, objs: Iterable[Any]) -> List[dict]:
+        fields, values = self.fields, self._values
+        return [dict(zip(fields, values(obj))) for obj in objs]
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Кодує словники, списки, числа, рядки та дати в JSON через orjson.
+    """
+    return orjson.dumps(value)
+
+
+def json_response(value: Any, headers: Optional[dict] = None) -> Response:
+    """
+    Відповідь з уже серіалізованим тілом: FastAPI не валідує і не кодує її вдруге.
+    """
+    body = value if isinstance(value, bytes) else dumps(value)
+    return Response(body, media_type="application/json", headers=headers)
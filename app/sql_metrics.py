@@ -0,0 +1,131 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Статистика SQL поточного запиту; None — інструментацію вимкнено
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("sql_query_stats", default=None)
+
+
+class QueryStats:
+    """
+    SQL-запити, виконані в межах одного HTTP-запиту (або блоку :func:`track`).
+
+    Однакові тексти запитів рахуються разом: той самий SELECT, повторений для кожного
+    рядка, — ознака N+1.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[statement] += 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Запити, виконані щонайменше ``threshold`` разів (за замовчуванням SQL_REPEATED_STATEMENT_THRESHOLD).
+        """
+        threshold = settings.SQL_REPEATED_STATEMENT_THRESHOLD if threshold is None else threshold
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.total_seconds * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_seconds * 1000:.2f}"
+        )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("sql_metrics_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@contextmanager
+def track() -> Iterator[QueryStats]:
+    """
+    Збирає статистику SQL-запитів, виконаних у поточному контексті (задачі) всередині блоку.
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _shorten(statement: Optional[str], limit: int = 200) -> str:
+    statement = " ".join((statement or "").split())
+    return statement if len(statement) <= limit else statement[:limit] + "…"
+
+
+class SQLInstrumentationMiddleware:
+    """
+    ASGI-middleware: кількість SQL-запитів, сумарний час у базі та найповільніший запит
+    для кожного HTTP-запиту.
+
+    Дані додаються в заголовок ``Server-Timing`` і в рядок логу; повторювані однакові
+    запити (ймовірний N+1) логуються як попередження. Вмикається налаштуванням SQL_INSTRUMENTATION.
+    Для потокових відповідей заголовок містить лише запити, виконані до початку відповіді.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []), (b"server-timing", stats.server_timing().encode("latin-1"))
+                ]
+            await send(message)
+
+        with track() as stats:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self._log(scope, stats)
+
+    @staticmethod
+    def _log(scope, stats: QueryStats) -> None:
+        request = f'{scope["method"]} {scope["path"]}'
+        logger.info(
+            "%s: %d queries, %.2f ms in db, slowest %.2f ms: %s",
+            request,
+            stats.count,
+            stats.total_seconds * 1000,
+            stats.slowest_seconds * 1000,
+            _shorten(stats.slowest_statement),
+        )
+        for statement, n in stats.repeated():
+            logger.warning("%s: possible N+1, statement repeated %d times: %s", request, n, _shorten(statement))
@@ -1,19 +1,49 @@
+import base64
+import hashlib
+import json
+import time
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
+from .cache import TTLCache
 from .config import settings
+from .executors import password_pool
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Кеш уже перевірених токенів: ключ — SHA-256 токена, значення — розкодовані claims.
+# Кожен запис живе рівно до "exp" токена.
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_MAXSIZE)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, user=None) -> str:
+    """
+    Створює JWT токен доступу.
+
+    Якщо передано ``user``, токен стає self-contained: містить ``uid``, ``is_active``,
+    ``is_verified`` та ``ver`` (версію токенів користувача), і запити можна
+    авторизувати без звернення до кешу чи бази даних.
+    """
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update({
+            "uid": user.id,
+            "is_active": user.is_active,
+            "is_verified": user.is_verified,
+            "ver": user.token_version,
+        })
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -23,8 +53,36 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 def decode_access_token(token: str) -> Optional[dict]:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = exp - time.time()
+        if ttl > 0:
+            token_cache.set(key, payload, ttl=ttl)
+    return dict(payload)
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    Пакує позицію keyset-пагінації у непрозорий для клієнта рядок.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Optional[list]:
+    """
+    Розпаковує курсор з :func:`encode_cursor`; для пошкодженого курсора повертає None.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) else None
@@ -0,0 +1,103 @@
+"""
+Бенчмарк пошуку контактів (GET /contacts/search) на SQLite/FTS5.
+
+Заповнює тимчасову базу адресними книгами різного розміру та порівнює
+crud.search_contacts з повним скануванням через LIKE. Час пошуку по індексу
+має рости значно повільніше за розмір адресної книги.
+
+Запуск: python -m benchmarks.bench_search
+"""
+import asyncio
+import os
+import random
+import string
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = ["joh", "smith", "555-12", "zed"]
+REPEAT = 20
+
+
+def random_word(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def populate(session, owner_id: int, size: int, rng: random.Random) -> None:
+    rows = []
+    for i in range(size):
+        first, last = random_word(rng, 6).capitalize(), random_word(rng, 8).capitalize()
+        rows.append({
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{last.lower()}@{random_word(rng, 5)}.com",
+            "phone": f"{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            "owner_id": owner_id,
+        })
+    # Кілька гарантованих збігів для запитів бенчмарку
+    rows[:3] = [
+        {"name": "John Smith", "email": "john@example.com", "phone": "555-1234", "owner_id": owner_id},
+        {"name": "Johanna Doe", "email": "jdoe@example.com", "phone": "555-1299", "owner_id": owner_id},
+        {"name": "Zed Zero", "email": "zed@example.com", "phone": "000-0000", "owner_id": owner_id},
+    ]
+    session.execute(insert(models.Contact), rows)
+    session.commit()
+
+
+async def timed(fn) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        await fn()
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+async def like_scan(session, owner_id: int, q: str):
+    pattern = f"%{q}%"
+    result = await session.scalars(
+        select(models.Contact)
+        .where(models.Contact.owner_id == owner_id)
+        .where(
+            models.Contact.name.ilike(pattern)
+            | models.Contact.email.ilike(pattern)
+            | models.Contact.phone.ilike(pattern)
+        )
+        .limit(20)
+    )
+    return result.all()
+
+
+async def main() -> None:
+    rng = random.Random(42)
+    print(f"{'contacts':>10} {'query':>8} {'fts5 ms':>10} {'like scan ms':>14}")
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            # Дані заповнюються синхронно, пошук вимірюється через асинхронний crud
+            engine = create_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(bind=engine)
+            session = sessionmaker(bind=engine)()
+            owner = models.User(email="bench@example.com", hashed_password="x")
+            session.add(owner)
+            session.commit()
+            owner_id = owner.id
+            populate(session, owner_id, size, rng)
+            session.close()
+            engine.dispose()
+
+            async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            async with AsyncSession(async_engine) as db:
+                for q in QUERIES:
+                    fts_ms = await timed(lambda: crud.search_contacts(db, owner_id, q))
+                    scan_ms = await timed(lambda: like_scan(db, owner_id, q))
+                    print(f"{size:>10} {q:>8} {fts_ms:>10.3f} {scan_ms:>14.3f}")
+            await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
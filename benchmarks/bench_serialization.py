@@ -0,0 +1,66 @@
+"""
+Бенчмарк серіалізації списку контактів (GET /contacts).
+
+Порівнює шлях FastAPI за замовчуванням (валідація ``response_model``, jsonable_encoder,
+json.dumps), TypeAdapter.dump_json після валідації та app.serialization (attrgetter + orjson)
+для списків від 10 до 10 000 контактів.
+
+Запуск: python -m benchmarks.bench_serialization
+"""
+import json
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import models, schemas, serialization
+
+SIZES = [10, 100, 1_000, 10_000]
+REPEAT = 20
+
+adapter = TypeAdapter(List[schemas.ContactResponse])
+serializer = serialization.Serializer.for_model(schemas.ContactResponse)
+
+
+def make_contacts(size: int) -> List[models.Contact]:
+    return [
+        models.Contact(id=i, name=f"Contact {i}", phone=f"555-{i:04d}", email=f"contact{i}@example.com", owner_id=1)
+        for i in range(size)
+    ]
+
+
+def fastapi_default(contacts) -> bytes:
+    validated = adapter.validate_python(contacts, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def type_adapter(contacts) -> bytes:
+    return adapter.dump_json(adapter.validate_python(contacts, from_attributes=True))
+
+
+def orjson_serializer(contacts) -> bytes:
+    return serialization.dumps(serializer.to_list(contacts))
+
+
+def timed(fn, contacts) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(contacts)
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def main() -> None:
+    paths = [fastapi_default, type_adapter, orjson_serializer]
+    print(f"{'contacts':>9} " + " ".join(f"{fn.__name__ + ', ms':>22}" for fn in paths) + f" {'speedup':>8}")
+    for size in SIZES:
+        contacts = make_contacts(size)
+        assert json.loads(orjson_serializer(contacts)) == json.loads(fastapi_default(contacts))
+        timings = [timed(fn, contacts) for fn in paths]
+        print(
+            f"{size:>9} " + " ".join(f"{t:>22.3f}" for t in timings) + f" {timings[0] / timings[-1]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
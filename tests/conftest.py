@@ -1,8 +1,16 @@
+from collections import Counter
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.database import Base, get_db
+from app.replicas import get_read_db
 from app.main import app
+from app import cache
+from tests.smtp_stub import SMTPStub
 
 # Create an in-memory SQLite test database
 TEST_DATABASE_URL = "sqlite:///./test.db"
@@ -10,6 +18,11 @@ TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Застосунок працює з тією самою базою через асинхронний драйвер. NullPool: TestClient і
+# asyncio.run у тестах запускають різні цикли подій, тож з'єднання не переживає свій цикл.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Override the dependency
 @pytest.fixture(scope="function")
 def db():
@@ -19,5 +32,69 @@ def db():
     session.close()
     Base.metadata.drop_all(bind=engine)  # Drop tables after test
 
-# Apply the database override
-app.dependency_overrides[get_db] = db
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
+# Ендпоінти отримують асинхронну сесію до тестової бази
+@pytest.fixture
+def app_db(db):
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    yield db
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_read_db, None)
+
+# Асинхронні тести (pytest.mark.anyio) виконуються лише на asyncio: цього вимагають aiosqlite та redis
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+# Локальний кеш користувачів живе в пам'яті процесу, тому очищаємо його між тестами
+@pytest.fixture(autouse=True)
+def clear_local_caches():
+    cache.user_cache.clear()
+    cache.token_version_cache.clear()
+    cache.contact_page_cache.local.clear()
+    yield
+    cache.user_cache.clear()
+    cache.token_version_cache.clear()
+    cache.contact_page_cache.local.clear()
+
+# Збирає SQL-запити, які застосунок виконав через тестовий асинхронний engine
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Блок виконав більше запитів, ніж дозволяє бюджет, або повторював однаковий запит (N+1).
+    """
+
+# Падає, якщо код усередині блоку виконав понад max_queries запитів або будь-який запит понад max_repeats разів
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(f"{len(statements)} queries exceed the budget of {max_queries}: {statements}")
+    if max_repeats is not None:
+        statement, n = Counter(statements).most_common(1)[0] if statements else (None, 0)
+        if n > max_repeats:
+            raise QueryBudgetExceeded(f"Statement repeated {n} times (max {max_repeats}): {statement}")
+
+# Локальний SMTP-сервер замість поштового сервісу
+@pytest.fixture
+def smtp_server():
+    server = SMTPStub().start()
+    yield server
+    server.stop()
@@ -0,0 +1,104 @@
+"""
+Локальна заміна SMTP-сервера для тестів: приймає листи в пам'ять, підтримує AUTH PLAIN/LOGIN,
+затримку відповіді та відмову окремим адресатам.
+
+Запуск окремо (для ручної перевірки): ``python -m tests.smtp_stub 1025``.
+"""
+import socketserver
+import sys
+import threading
+import time
+from email import message_from_bytes
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        stub = self.server.stub
+        with stub.lock:
+            stub.connections += 1
+        self.reply("220 smtp-stub ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-smtp-stub")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == "HELO":
+                self.reply("250 smtp-stub")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip().strip("<>")
+                code = stub.reject.get(address)
+                if code:
+                    self.reply(f"{code} Recipient rejected")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data += chunk
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.messages.append((recipients, message_from_bytes(data)))
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    """
+    SMTP-сервер у фоновому потоці на вільному локальному порту.
+
+    :param delay: Затримка (секунди) перед підтвердженням кожного листа — імітує повільний сервер.
+    """
+
+    def __init__(self, port: int = 0, delay: float = 0.0):
+        self.delay = delay
+        self.reject = {}
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.stub = self
+        self.host, self.port = self._server.server_address
+
+    def start(self) -> "SMTPStub":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    stub = SMTPStub(int(sys.argv[1]) if len(sys.argv) > 1 else 1025)
+    print(f"SMTP stub listening on {stub.host}:{stub.port}")
+    stub._server.serve_forever()
@@ -1,4 +1,7 @@
+import asyncio
+import time
 import pytest
+from unittest.mock import patch
 from app.utils import verify_password, get_password_hash
 from app.auth import create_access_token, decode_access_token
 from app.utils import verify_password, get_password_hash
@@ -6,9 +9,10 @@ import pytest
 from datetime import timedelta, datetime
 from jose import jwt, JWTError
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import auth, crud, models, utils
 from app.config import settings
+from app.principal import Principal
 
 # Тестируем создание access token
 def test_create_access_token():
@@ -46,15 +50,18 @@ def test_decode_access_token_invalid():
     payload = auth.decode_access_token(invalid_token)
     assert payload is None
 
-# Тест для функции get_db — проверяем, что генератор возвращает объект Session
-def test_get_db():
-    gen = auth.get_db()
-    db_instance = next(gen)
-    # Проверяем, что объект db_instance является экземпляром SQLAlchemy Session
-    assert isinstance(db_instance, Session)
-    # После первого next() генератор должен завершиться (с выбросом StopIteration)
-    with pytest.raises(StopIteration):
-        next(gen)
+# Тест для зависимости сессии авторизации — проверяем, что генератор возвращает объект AsyncSession
+def test_get_read_db():
+    async def scenario():
+        gen = auth.get_read_db()
+        db_instance = await gen.__anext__()
+        # Проверяем, что объект db_instance является экземпляром SQLAlchemy AsyncSession
+        assert isinstance(db_instance, AsyncSession)
+        # После первого шага генератор должен завершиться (с выбросом StopAsyncIteration)
+        with pytest.raises(StopAsyncIteration):
+            await gen.__anext__()
+
+    asyncio.run(scenario())
 
 # Для тестирования get_current_user создаём фиктивный DB session,
 # который реализует минимальный интерфейс для работы с crud.get_user_by_email
@@ -71,6 +78,8 @@ class DummySession:
         self.user = user
     def query(self, model):
         return DummyQuery(self.user)
+    def in_transaction(self):
+        return False
 
 def test_get_current_user_valid():
     # Фиктивный пользователь, который должен быть возвращён
@@ -85,14 +94,15 @@ def test_get_current_user_valid():
     token = auth.create_access_token({"sub": "test@example.com"})
 
     # Патчим crud.get_user_by_email, чтобы он возвращал dummy_user
-    def fake_get_user_by_email(db, email):
+    async def fake_get_user_by_email(db, email):
         return dummy_user if email == "test@example.com" else None
 
     original_get_user_by_email = crud.get_user_by_email
     crud.get_user_by_email = fake_get_user_by_email
 
-    result = auth.get_current_user(token, dummy_db)
-    assert result == dummy_user
+    result = asyncio.run(auth.get_current_user(token, dummy_db))
+    # Залежність повертає компактний Principal, а не ORM-модель
+    assert result == Principal.from_user(dummy_user)
 
     # Восстанавливаем оригинальную функцию
     crud.get_user_by_email = original_get_user_by_email
@@ -101,7 +111,7 @@ def test_get_current_user_invalid_token():
     dummy_db = DummySession(None)
     invalid_token = "invalid.token"
     with pytest.raises(HTTPException) as exc_info:
-        auth.get_current_user(invalid_token, dummy_db)
+        asyncio.run(auth.get_current_user(invalid_token, dummy_db))
     assert exc_info.value.status_code == 401
     assert "Could not validate credentials" in exc_info.value.detail
 
@@ -110,14 +120,14 @@ def test_get_current_user_user_not_found():
     dummy_db = DummySession(None)
     token = auth.create_access_token({"sub": "nonexistent@example.com"})
 
-    def fake_get_user_by_email(db, email):
+    async def fake_get_user_by_email(db, email):
         return None
 
     original_get_user_by_email = crud.get_user_by_email
     crud.get_user_by_email = fake_get_user_by_email
 
     with pytest.raises(HTTPException) as exc_info:
-        auth.get_current_user(token, dummy_db)
+        asyncio.run(auth.get_current_user(token, dummy_db))
     assert exc_info.value.status_code == 401
     assert "Could not validate credentials" in exc_info.value.detail
 
@@ -239,3 +249,98 @@ def test_create_access_token():
 
     assert isinstance(token, str)  # Токен має бути строкою
     assert "." in token  # JWT токен має містити крапки (роздільники секцій)
+
+# Повторне декодування того самого токена обслуговується з кешу без jwt.decode
+def test_decode_access_token_uses_cache():
+    utils.token_cache.clear()
+    token = utils.create_access_token({"sub": "cached@example.com"})
+    first = utils.decode_access_token(token)
+    with patch("app.utils.jwt.decode") as mock_decode:
+        second = utils.decode_access_token(token)
+    mock_decode.assert_not_called()
+    assert second == first
+    assert utils.token_cache.hits == 1
+
+# Запис кешу живе не довше, ніж сам токен
+def test_decode_access_token_cache_respects_exp():
+    utils.token_cache.clear()
+    token = utils.create_access_token({"sub": "short@example.com"}, expires_delta=timedelta(seconds=1))
+    assert utils.decode_access_token(token) is not None
+    time.sleep(2.1)
+    assert utils.decode_access_token(token) is None
+    assert len(utils.token_cache) == 0
+
+# Self-contained токен авторизує запит без пошуку користувача
+def test_get_current_principal_self_contained_token():
+    user = models.User(id=7, email="stateless@example.com", is_active=True, is_verified=True, token_version=3)
+    token = utils.create_access_token({"sub": user.email}, user=user)
+    claims = utils.decode_access_token(token)
+    assert (claims["uid"], claims["ver"], claims["is_verified"]) == (7, 3, True)
+
+    with patch("app.crud.get_user_by_email") as mock_get_user, \
+            patch("app.crud.get_token_version", return_value=3) as mock_get_version:
+        first = asyncio.run(auth.get_current_principal(token, DummySession(None)))
+        second = asyncio.run(auth.get_current_principal(token, DummySession(None)))
+    mock_get_user.assert_not_called()
+    # Версія токенів береться з локального кешу після першого запиту
+    mock_get_version.assert_called_once()
+    assert (first.id, first.email, first.is_verified) == (7, "stateless@example.com", True)
+    assert second.id == 7
+
+# Токен зі старою версією (наприклад, після скидання пароля) відхиляється
+def test_get_current_principal_revoked_token():
+    user = models.User(id=8, email="revoked@example.com", is_active=True, is_verified=True, token_version=0)
+    token = utils.create_access_token({"sub": user.email}, user=user)
+    with patch("app.crud.get_token_version", return_value=1):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(auth.get_current_principal(token, DummySession(None)))
+    assert exc_info.value.status_code == 401
+
+# Відсутній користувач потрапляє в негативний кеш: повторні запити не йдуть у БД
+def test_get_current_user_negative_cache():
+    token = auth.create_access_token({"sub": "deleted@example.com"})
+    with patch("app.crud.get_user_by_email", return_value=None) as mock_get_user:
+        for _ in range(3):
+            with pytest.raises(HTTPException) as exc_info:
+                asyncio.run(auth.get_current_user(token, DummySession(None)))
+            assert exc_info.value.status_code == 401
+    mock_get_user.assert_called_once()
+
+# Конкурентні промахи кешу для одного користувача виконують лише один запит до БД
+def test_get_current_user_single_flight():
+    dummy_user = models.User(
+        id=5, email="popular@example.com", hashed_password="dummy",
+        is_active=True, is_verified=True, token_version=0
+    )
+    token = auth.create_access_token({"sub": dummy_user.email})
+
+    async def slow_get_user_by_email(db, email):
+        await asyncio.sleep(0.1)
+        return dummy_user
+
+    async def scenario():
+        return await asyncio.gather(
+            *(auth.get_current_user(token, DummySession(None)) for _ in range(5))
+        )
+
+    with patch("app.crud.get_user_by_email", side_effect=slow_get_user_by_email) as mock_get_user:
+        users = asyncio.run(scenario())
+    mock_get_user.assert_called_once()
+    assert all(user.email == "popular@example.com" for user in users)
+
+# Після пошуку користувача в БД з'єднання повертається в пул до виконання обробника
+def test_get_current_user_releases_connection(app_db):
+    from tests.conftest import TestingAsyncSessionLocal
+
+    app_db.add(models.User(email="release@example.com", hashed_password="hashed", is_active=True))
+    app_db.commit()
+    token = auth.create_access_token({"sub": "release@example.com"})
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as db:
+            user = await auth.get_current_user(token, db)
+            return user, db.in_transaction()
+
+    user, in_transaction = asyncio.run(scenario())
+    assert user.email == "release@example.com"
+    assert not in_transaction
@@ -2,15 +2,14 @@ import pytest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import get_db
 from app import schemas, crud, utils, models
 
 client = TestClient(app)
 
-# ✅ Mock email sending
+# ✅ Mock queuing of the verification email
 @pytest.fixture
 def mock_send_email():
-    with patch("app.routers.auth.send_verification_email_internal") as mock:
+    with patch("app.mailer.queue_verification_email") as mock:
         yield mock
 
 # ✅ Test successful user registration
@@ -27,7 +26,8 @@ def test_register_user(db, mock_send_email):
 
     assert response.status_code == 201
     assert response.json()["email"] == "test@example.com"
-    mock_send_email.assert_called_once_with("test@example.com")
+    mock_send_email.assert_called_once()
+    assert mock_send_email.call_args.args[1] == "test@example.com"
 
 
 # ✅ Test registering with an existing email
@@ -96,51 +96,38 @@ def test_send_verification_email_already_verified(db):
 
 
 # ✅ Test confirming email successfully
-def test_confirm_email(db):
+def test_confirm_email(app_db):
     # Create a persistent user by adding it to the test database session.
+    # The app_db fixture makes the endpoint use an async session on the same test database.
     mock_user = models.User(
         id=1, email="test@example.com", hashed_password="hashed", is_active=True, is_verified=False
     )
-    db.add(mock_user)
-    db.commit()
-
-    # Override the get_db dependency so that the endpoint uses our test db session.
-    app.dependency_overrides[get_db] = lambda: db
+    app_db.add(mock_user)
+    app_db.commit()
 
     response = client.get("/auth/confirm-email?email=test@example.com")
 
-    # Remove dependency override after the test.
-    app.dependency_overrides.pop(get_db, None)
-
     assert response.status_code == 200
 
 
 # ✅ Test confirming already verified email
-def test_confirm_already_verified_email(db):
+def test_confirm_already_verified_email(app_db):
     mock_user = models.User(
         id=1, email="test@example.com", hashed_password="hashed", is_active=True, is_verified=True
     )
-    db.add(mock_user)
-    db.commit()
-
-    app.dependency_overrides[get_db] = lambda: db
+    app_db.add(mock_user)
+    app_db.commit()
 
     response = client.get("/auth/confirm-email?email=test@example.com")
 
-    app.dependency_overrides.pop(get_db, None)
-
     assert response.status_code == 400
     assert response.json()["detail"] == "Email already verified"
 
 
 # ✅ Test confirming a non-existent email
-def test_confirm_non_existent_email(db):
+def test_confirm_non_existent_email(app_db):
     # Do not add any user to the db for this test.
-    app.dependency_overrides[get_db] = lambda: db
-
     response = client.get("/auth/confirm-email?email=nonexistent@example.com")
 
-    app.dependency_overrides.pop(get_db, None)
-
     assert response.status_code == 404
     assert response.json()["detail"] == "User not found"
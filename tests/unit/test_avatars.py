@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import io
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.requests import Request
+
+from app import avatars, models
+from app.auth import get_current_user
+from app.executors import BoundedProcessPool
+from app.main import app
+from app.principal import Principal
+
+client = TestClient(app)
+
+
+def image_bytes(size=(800, 600), fmt="PNG", color="teal") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, fmt)
+    return output.getvalue()
+
+
+class RecordingStorage(avatars.LocalStorage):
+    """
+    Локальне сховище, яке рахує збереження та найбільшу кількість одночасних збережень.
+    """
+
+    def __init__(self, directory, delay=0.0):
+        super().__init__(str(directory), "/media/avatars")
+        self.delay = delay
+        self.saved = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def save(self, key, data):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            self.saved.append(key)
+            return super().save(key, data)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+# Сховище без save не створюється, а не падає посеред запиту
+def test_storage_backend_must_implement_save():
+    class Incomplete(avatars.AvatarStorage):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+# Конвеєр з локальним сховищем; зменшення в пулі потоків, щоб тести не запускали процеси
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    pipeline = avatars.AvatarPipeline(
+        RecordingStorage(tmp_path), BoundedProcessPool("test_avatars", max_workers=0, max_queue=8),
+        max_concurrent_uploads=2, max_upload_bytes=200_000, size=64,
+    )
+    monkeypatch.setattr(avatars, "pipeline", pipeline)
+    return pipeline
+
+
+@pytest.fixture
+def users(app_db):
+    users = [models.User(email=f"avatar{i}@example.com", hashed_password="hashed") for i in range(2)]
+    app_db.add_all(users)
+    app_db.commit()
+    principals = [Principal.from_user(user) for user in users]
+    yield principals
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def upload_as(principal, content, content_type="image/png"):
+    app.dependency_overrides[get_current_user] = lambda: principal
+    return client.post("/users/me/avatar", files={"file": ("avatar.png", content, content_type)})
+
+
+def test_resize_image_makes_square_webp():
+    result = Image.open(io.BytesIO(avatars.resize_image(image_bytes((1200, 400)), 128, 80)))
+    assert result.format == "WEBP"
+    assert result.size == (128, 128)
+
+
+def test_resize_image_rejects_non_images():
+    with pytest.raises(avatars.InvalidImageError):
+        avatars.resize_image(b"not an image", 128, 80)
+
+
+def test_hash_upload_checks_size_before_reading():
+    upload = io.BytesIO(b"x" * 100_000)
+    assert avatars.hash_upload(upload, max_bytes=100_000) == hashlib.sha256(b"x" * 100_000).hexdigest()
+    assert upload.tell() == 0
+
+    oversized = io.BytesIO(b"x" * 100_001)
+    oversized.read = lambda *args: pytest.fail("oversized upload should not be read")
+    with pytest.raises(avatars.UploadTooLargeError):
+        avatars.hash_upload(oversized, max_bytes=100_000)
+
+
+# Той самий файл від іншого користувача не обробляється і не вивантажується вдруге
+def test_same_file_is_uploaded_once(pipeline, users, app_db, tmp_path):
+    content = image_bytes()
+    first = upload_as(users[0], content)
+    second = upload_as(users[1], content)
+    assert first.status_code == second.status_code == 200
+    url = first.json()["avatar_url"]
+    assert second.json()["avatar_url"] == url
+    assert url.startswith("/media/avatars/") and url.endswith(".webp")
+
+    assert len(pipeline.storage.saved) == 1
+    assert (pipeline.uploaded, pipeline.deduplicated) == (1, 1)
+    stored = Image.open(tmp_path / url.rsplit("/", 1)[1])
+    assert stored.size == (64, 64)
+    blob = app_db.query(models.AvatarBlob).one()
+    assert blob.url == url and blob.content_hash == pipeline.storage.saved[0]
+
+    assert upload_as(users[0], image_bytes(color="orange")).json()["avatar_url"] != url
+    assert len(pipeline.storage.saved) == 2
+
+
+def test_upload_errors(pipeline, users):
+    response = upload_as(users[0], b"\x89PNG broken")
+    assert (response.status_code, response.json()["detail"]) == (400, "Invalid image")
+    response = upload_as(users[0], image_bytes((2000, 2000), fmt="BMP"), "image/bmp")
+    assert response.status_code == 413
+    assert pipeline.storage.saved == []
+
+
+# Завеликий Content-Length відхиляється ще до читання тіла запиту
+def test_oversized_body_rejected_before_parsing(pipeline, users, monkeypatch):
+    async def fail(*args, **kwargs):
+        pytest.fail("multipart body should not be parsed")
+
+    monkeypatch.setattr(Request, "_get_form", fail)
+    response = upload_as(users[0], b"x" * 300_000)
+    assert (response.status_code, response.json()["detail"]) == (413, "Image is too large")
+
+
+def test_storage_failure_returns_500(pipeline, users, monkeypatch):
+    def fail(key, data):
+        raise avatars.AvatarStorageError("storage is down")
+
+    monkeypatch.setattr(pipeline.storage, "save", fail)
+    response = upload_as(users[0], image_bytes())
+    assert (response.status_code, response.json()["detail"]) == (500, "Failed to upload image")
+
+
+# Одночасно вивантажується не більше max_concurrent_uploads зображень
+def test_uploads_are_capped(pipeline):
+    pipeline.storage.delay = 0.1
+
+    async def scenario():
+        await asyncio.gather(*(pipeline.upload(f"key{i}", b"data") for i in range(6)))
+
+    asyncio.run(scenario())
+    assert pipeline.storage.max_active == 2
+    assert pipeline.stats()["uploaded"] == 6
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from app import cache
+from app.cache import TTLCache
+
+
+# Тестуємо базову роботу LRU-кешу
+def test_ttl_cache_get_set():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    assert c.get("a") == 1
+    assert c.get("missing") is None
+    assert c.hits == 1
+    assert c.misses == 1
+
+# Найстаріший за використанням запис витісняється при переповненні
+def test_ttl_cache_evicts_least_recently_used():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.evictions == 1
+
+# Записи з вичерпаним TTL не повертаються
+def test_ttl_cache_expires_entries():
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("a") is None
+    assert len(c) == 0
+
+# Інвалідація прибирає користувача з локального рівня кешу
+def test_invalidate_user_removes_local_entry():
+    cache.user_cache.set("cached@example.com", {"id": 1, "email": "cached@example.com"})
+    asyncio.run(cache.invalidate_user("cached@example.com"))
+    assert cache.user_cache.get("cached@example.com") is None
+
+# Ендпоінт метрик віддає статистику кешів
+def test_metrics_endpoint_reports_caches():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    response = TestClient(app, client=("127.0.0.1", 50000)).get("/metrics/")
+    assert response.status_code == 200
+    data = response.json()
+    assert {"size", "maxsize", "hit_ratio"} <= set(data["token_cache"])
+    assert "user_cache" in data
+    assert data["redis_pool"] == {"initialized": False}
+    assert {"checked_out", "overflow", "wait_p95_ms"} <= set(data["db_pool"])
+
+# Метрики закриті для клієнтів поза METRICS_ALLOWED_NETWORKS
+def test_metrics_endpoint_rejects_external_clients(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    assert TestClient(app, client=("203.0.113.7", 50000)).get("/metrics/").status_code == 403
+    # TestClient за замовчуванням підставляє хост "testclient", який не є IP-адресою
+    assert TestClient(app).get("/metrics/").status_code == 403
+    monkeypatch.setattr(cache.settings, "METRICS_ALLOWED_NETWORKS", ["203.0.113.0/24"])
+    assert TestClient(app, client=("203.0.113.7", 50000)).get("/metrics/").status_code == 200
+
+# TTL розкидається в межах ±CACHE_TTL_JITTER
+def test_jittered_ttl_stays_within_bounds():
+    values = {cache.jittered(100) for _ in range(50)}
+    jitter = cache.settings.CACHE_TTL_JITTER
+    assert all(100 * (1 - jitter) <= v <= 100 * (1 + jitter) for v in values)
+    assert len(values) > 1
+
+# Помилка loader отримують усі, хто чекав на той самий ключ
+def test_single_flight_propagates_errors():
+    flight = cache.SingleFlight()
+    calls = []
+
+    async def failing_loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flight.do("key", failing_loader) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.shared == 2
+
+# Скасування запиту-виконавця не скасовує тих, хто чекав: один з них завантажує ключ сам
+def test_single_flight_survives_leader_cancellation():
+    flight = cache.SingleFlight()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "user"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("key", loader))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do("key", loader)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        return results
+
+    results = asyncio.run(scenario())
+    assert sorted(results) == [("user", False), ("user", True)]
+    assert len(calls) == 2
+    assert flight.shared == 1
+
+# Кеш відповідей: повторне читання з пам'яті процесу, великі тіла не кешуються
+def test_response_cache_hits_and_size_bound():
+    page_cache = cache.ResponseCache("test", ttl=60, local_maxsize=8, local_ttl=60, max_bytes=10)
+    assert asyncio.run(page_cache.get("k")) is None
+    asyncio.run(page_cache.set("k", b"[1,2,3]"))
+    asyncio.run(page_cache.set("big", b"x" * 11))
+    assert asyncio.run(page_cache.get("k")) == b"[1,2,3]"
+    assert asyncio.run(page_cache.get("big")) is None
+    stats = page_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["too_large"]) == (1, 2, 1)
+    assert stats["bytes_served"] == stats["bytes_stored"] == 7
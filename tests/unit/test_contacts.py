@@ -0,0 +1,276 @@
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import cache, crud, models, utils
+from app.auth import get_current_principal
+from app.config import settings
+from app.main import app
+from app.principal import Principal
+from tests.conftest import count_queries
+
+client = TestClient(app)
+
+
+# Власник контактів у тестовій БД; автентифікацію підміняємо готовим Principal
+@pytest.fixture
+def owner(app_db):
+    user = models.User(email="owner@example.com", hashed_password="hashed", is_active=True, is_verified=True)
+    app_db.add(user)
+    app_db.commit()
+    app_db.refresh(user)
+    app.dependency_overrides[get_current_principal] = lambda: Principal.from_user(user)
+    yield user
+    app.dependency_overrides.pop(get_current_principal, None)
+
+
+def add_contacts(db, owner, names):
+    for i, name in enumerate(names):
+        response = client.post("/contacts/", json={"name": name, "phone": f"000-{i}", "email": f"c{i}@example.com"})
+        assert response.status_code == 201
+
+
+def contacts_of(db, owner):
+    # Контакти записує застосунок через власну сесію, тому синхронна сесія тесту читає їх заново
+    db.expire_all()
+    return db.query(models.Contact).filter_by(owner_id=owner.id, deleted_at=None).order_by(models.Contact.id).all()
+
+
+# Без cursor ендпоінт повертає простий список (зворотна сумісність skip/limit)
+def test_read_contacts_legacy_list(db, owner):
+    add_contacts(db, owner, ["Alice", "Bob", "Carol"])
+    response = client.get("/contacts/?skip=1&limit=1")
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+    assert len(response.json()) == 1
+
+# Keyset-пагінація проходить усі контакти в порядку (name, id) без повторів
+def test_read_contacts_cursor_pagination(db, owner):
+    add_contacts(db, owner, ["Dave", "alice", "Carol", "Bob", "Bob"])
+    seen, cursor = [], ""
+    while cursor is not None:
+        response = client.get("/contacts/", params={"cursor": cursor, "limit": 2})
+        assert response.status_code == 200
+        page = response.json()
+        seen += [(c["name"], c["id"]) for c in page["items"]]
+        cursor = page["next_cursor"]
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+
+# Пошкоджений курсор — помилка клієнта
+def test_read_contacts_invalid_cursor(db, owner):
+    response = client.get("/contacts/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+# Пошук повертає лише контакти власника, що відповідають запиту
+def test_search_contacts_endpoint(db, owner):
+    add_contacts(db, owner, ["Alice Cooper", "Bob Dylan", "Alicia Keys"])
+    response = client.get("/contacts/search", params={"q": "ali"})
+    assert response.status_code == 200
+    assert sorted(c["name"] for c in response.json()) == ["Alice Cooper", "Alicia Keys"]
+
+    response = client.get("/contacts/search", params={"q": ""})
+    assert response.status_code == 422
+
+# CSV-імпорт вставляє валідні рядки пачками і повідомляє про помилкові
+def test_import_contacts_csv(db, owner, monkeypatch):
+    monkeypatch.setattr(settings, "CONTACT_IMPORT_BATCH_SIZE", 2)
+    body = (
+        "name,phone,email\n"
+        "Alice,111,alice@example.com\n"
+        "Bob,222,not-an-email\n"
+        "Carol,333,carol@example.com\n"
+        "Dave,444,dave@example.com\n"
+    )
+    response = client.post("/contacts/import", files={"file": ("contacts.csv", body, "text/csv")})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (3, 1)
+    assert result["errors"][0]["row"] == 3
+    assert result["errors"][0]["errors"][0].startswith("email")
+    assert {c.name for c in contacts_of(db, owner)} == {"Alice", "Carol", "Dave"}
+
+# NDJSON-імпорт: некоректний JSON — помилка лише цього рядка
+def test_import_contacts_ndjson(db, owner):
+    body = (
+        '{"name": "Eve", "phone": "555", "email": "eve@example.com"}\n'
+        "\n"
+        "{broken\n"
+        '{"name": "Frank", "phone": "666"}\n'
+        '{"name": "Grace", "phone": "777", "email": "grace@example.com"}\n'
+    )
+    response = client.post("/contacts/import", files={"file": ("contacts.ndjson", body, "application/x-ndjson")})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (2, 2)
+    assert [e["row"] for e in result["errors"]] == [3, 4]
+    assert result["rows_per_second"] > 0
+
+# Формат, який не вдається визначити, відхиляється
+def test_import_contacts_unknown_format(db, owner):
+    response = client.post("/contacts/import", files={"file": ("contacts.txt", "x", "text/plain")})
+    assert response.status_code == 400
+
+# NDJSON-експорт віддає всі контакти, навіть коли вони не вміщаються в один chunk
+def test_export_contacts_ndjson(db, owner, monkeypatch):
+    monkeypatch.setattr(settings, "CONTACT_EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "CONTACT_EXPORT_CHUNK_SIZE", 64)
+    add_contacts(db, owner, ["Alice", "Bob", "Carol", "Dave", "Eve"])
+    response = client.get("/contacts/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in rows] == ["Alice", "Bob", "Carol", "Dave", "Eve"]
+    assert set(rows[0]) == {"id", "name", "phone", "email"}
+
+# CSV-експорт з gzip можна знову імпортувати
+def test_export_contacts_csv_gzip_roundtrip(db, owner):
+    add_contacts(db, owner, ["Alice", "Bob"])
+    response = client.get("/contacts/export", params={"format": "csv", "gzip": True})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [r["name"] for r in rows] == ["Alice", "Bob"]
+
+    response = client.post("/contacts/import", files={"file": ("contacts.csv", response.text, "text/csv")})
+    assert response.json()["imported"] == 2
+
+# Повторний запит з актуальним ETag отримує 304 без тіла
+def test_read_contacts_not_modified(db, owner):
+    add_contacts(db, owner, ["Alice"])
+    response = client.get("/contacts/")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get("/contacts/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Інші параметри запиту — інший ETag
+    assert client.get("/contacts/?limit=1", headers={"If-None-Match": etag}).status_code == 200
+
+# Зміна контактів робить старий ETag недійсним
+def test_contact_write_changes_etag(db, owner):
+    add_contacts(db, owner, ["Alice"])
+    contact_id = contacts_of(db, owner)[0].id
+    etag = client.get(f"/contacts/{contact_id}").headers["etag"]
+    assert client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/contacts/", json={"name": "Bob", "phone": "1", "email": "bob@example.com"})
+    response = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+# "If-None-Match: *" не перетворює відсутній контакт на 304
+def test_wildcard_if_none_match_on_missing_contact(db, owner):
+    add_contacts(db, owner, ["Alice"])
+    contact_id = contacts_of(db, owner)[0].id
+    assert client.get("/contacts/999999", headers={"If-None-Match": "*"}).status_code == 404
+    assert client.get(f"/contacts/{contact_id}", headers={"If-None-Match": "*"}).status_code == 304
+
+# Збіг ETag контакту коштує лише читання версії власника, без запиту самого контакту
+def test_read_contact_not_modified_is_one_query(db, owner):
+    add_contacts(db, owner, ["Alice"])
+    contact_id = contacts_of(db, owner)[0].id
+    etag = client.get(f"/contacts/{contact_id}").headers["etag"]
+    with count_queries() as queries:
+        response = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(queries) == 1
+    assert "contacts_version" in queries[0] and "FROM contacts" not in queries[0]
+
+# Сторінка списку береться з кешу відповідей, доки контакти не змінились
+def test_read_contacts_served_from_page_cache(db, owner, monkeypatch):
+    add_contacts(db, owner, ["Alice"])
+    first = client.get("/contacts/")
+    assert [c["name"] for c in first.json()] == ["Alice"]
+
+    # Друге читання не звертається до запиту контактів
+    monkeypatch.setattr(crud, "get_contacts", lambda *a, **kw: pytest.fail("page should be cached"))
+    second = client.get("/contacts/")
+    assert second.content == first.content
+    monkeypatch.undo()
+
+    add_contacts(db, owner, ["Bob"])
+    assert len(client.get("/contacts/").json()) == 2
+
+# Оновлення та видалення контакту; видалений контакт більше не читається
+def test_update_and_delete_contact(db, owner):
+    add_contacts(db, owner, ["Alice"])
+    contact_id = contacts_of(db, owner)[0].id
+    response = client.put(f"/contacts/{contact_id}", json={"name": "Alicia", "phone": "1", "email": "a@example.com"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Alicia"
+
+    assert client.delete(f"/contacts/{contact_id}").status_code == 204
+    assert client.get(f"/contacts/{contact_id}").status_code == 404
+    assert client.get("/contacts/").json() == []
+    assert client.delete(f"/contacts/{contact_id}").status_code == 404
+
+# Дельта-синхронізація повертає лише зміни після курсора, включно з видаленнями
+def test_contact_changes_since_cursor(db, owner):
+    add_contacts(db, owner, ["Alice", "Bob", "Carol"])
+    first = client.get("/contacts/changes", params={"limit": 2}).json()
+    assert first["has_more"] is True
+    rest = client.get("/contacts/changes", params={"since": first["next_cursor"]}).json()
+    assert rest["has_more"] is False
+    assert [c["name"] for c in first["changes"] + rest["changes"]] == ["Alice", "Bob", "Carol"]
+
+    cursor = rest["next_cursor"]
+    empty = client.get("/contacts/changes", params={"since": cursor}).json()
+    assert empty == {"changes": [], "next_cursor": cursor, "has_more": False}
+
+    alice, bob = first["changes"]
+    client.put(f"/contacts/{alice['id']}", json={"name": "Alicia", "phone": "1", "email": "a@example.com"})
+    client.delete(f"/contacts/{bob['id']}")
+    delta = client.get("/contacts/changes", params={"since": cursor}).json()["changes"]
+    assert [(c["name"], c["deleted_at"] is not None) for c in delta] == [("Alicia", False), ("Bob", True)]
+
+# Пошкоджений курсор синхронізації — помилка клієнта
+def test_contact_changes_invalid_cursor(db, owner):
+    response = client.get("/contacts/changes", params={"since": utils.encode_cursor(["x", 1])})
+    assert response.status_code == 400
+
+# Пакетне читання: порядок запиту, чужі та неіснуючі id — у missing
+def test_batch_get_contacts(db, owner):
+    add_contacts(db, owner, ["Alice", "Bob", "Carol"])
+    other = models.User(email="other@example.com", hashed_password="hashed")
+    db.add(other)
+    db.commit()
+    foreign = models.Contact(name="Eve", phone="1", email="e@example.com", owner_id=other.id)
+    db.add(foreign)
+    db.commit()
+    ids = {c.name: c.id for c in contacts_of(db, owner)}
+
+    response = client.post(
+        "/contacts/batch-get", json={"ids": [ids["Carol"], 9999, ids["Alice"], foreign.id, ids["Carol"]]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [c["name"] for c in data["contacts"]] == ["Carol", "Alice"]
+    assert data["missing"] == [9999, foreign.id]
+
+# Кількість id обмежена
+def test_batch_get_contacts_too_many_ids(db, owner, monkeypatch):
+    monkeypatch.setattr(settings, "CONTACT_BATCH_GET_MAX_IDS", 2)
+    response = client.post("/contacts/batch-get", json={"ids": [1, 2, 3]})
+    assert response.status_code == 400
+
+# fields обмежує поля кожного елемента списку
+def test_read_contacts_sparse_fields(db, owner):
+    add_contacts(db, owner, ["Bob", "Alice"])
+    response = client.get("/contacts/", params={"fields": "name,id"})
+    assert response.status_code == 200
+    assert [set(c) for c in response.json()] == [{"name", "id"}] * 2
+
+    page = client.get("/contacts/", params={"fields": "email", "cursor": "", "limit": 1}).json()
+    assert page["items"] == [{"email": "c1@example.com"}]
+    page = client.get("/contacts/", params={"fields": "email", "cursor": page["next_cursor"], "limit": 1}).json()
+    assert page == {"items": [{"email": "c0@example.com"}], "next_cursor": None}
+
+# Невідоме поле — помилка клієнта
+def test_read_contacts_unknown_field(db, owner):
+    assert client.get("/contacts/", params={"fields": "id,password"}).status_code == 400
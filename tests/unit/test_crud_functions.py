@@ -1,81 +1,87 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from app.database import Base
 from app import crud, models, schemas, utils
 
+# crud асинхронний: тести виконуються в циклі подій через плагін anyio
+pytestmark = pytest.mark.anyio
+
 # Настройка тестовой БД SQLite
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Таблиці створює синхронний engine, crud працює через асинхронний драйвер
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Фикстура для создания тестовой БД
 @pytest.fixture(scope="function")
-def db() -> Session:
+async def db() -> AsyncSession:
     Base.metadata.create_all(bind=engine)
     session = TestingSessionLocal()
     try:
         yield session
     finally:
-        session.close()
+        await session.close()
         Base.metadata.drop_all(bind=engine)
 
 # Тест: получение пользователя по токену
-def test_get_user_by_token(db: Session):
+async def test_get_user_by_token(db: AsyncSession):
     # Создаем пользователя с токеном
     user = models.User(email="token_user@example.com", hashed_password="hashed")
     # Предположим, что у модели User есть поле token
     user.token = "testtoken"
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
-    retrieved_user = crud.get_user_by_token(db, "testtoken")
+    retrieved_user = await crud.get_user_by_token(db, "testtoken")
     assert retrieved_user is not None
     assert retrieved_user.email == "token_user@example.com"
 
 # Тест: получение пользователя по email
-def test_get_user_by_email(db: Session):
+async def test_get_user_by_email(db: AsyncSession):
     user = models.User(email="email_user@example.com", hashed_password="hashed")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
-    retrieved_user = crud.get_user_by_email(db, "email_user@example.com")
+    retrieved_user = await crud.get_user_by_email(db, "email_user@example.com")
     assert retrieved_user is not None
     assert retrieved_user.email == "email_user@example.com"
 
 # Тест: создание пользователя
-def test_create_user(db: Session):
+async def test_create_user(db: AsyncSession):
     user_in = schemas.UserCreate(email="new_user@example.com", password="secret")
-    created_user = crud.create_user(db, user_in)
+    hashed_password = await utils.get_password_hash_async("secret")
+    created_user = await crud.create_user(db, user_in, hashed_password=hashed_password)
     assert created_user is not None
     assert created_user.email == "new_user@example.com"
-    # Проверяем, что пароль был захеширован (не совпадает с исходным)
-    assert created_user.hashed_password != "secret"
-    # Можно дополнительно проверить работу функции хеширования, если нужно:
+    # Сохраняется переданный хеш, а не исходный пароль
+    assert created_user.hashed_password == hashed_password
     assert utils.verify_password("secret", created_user.hashed_password)
 
 # Тест: получение пользователя по id
-def test_get_user(db: Session):
+async def test_get_user(db: AsyncSession):
     user = models.User(email="get_user@example.com", hashed_password="hashed")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
-    retrieved_user = crud.get_user(db, user.id)
+    retrieved_user = await crud.get_user(db, user.id)
     assert retrieved_user is not None
     assert retrieved_user.email == "get_user@example.com"
 
 # Тест: получение контактов для пользователя
-def test_get_contacts(db: Session):
+async def test_get_contacts(db: AsyncSession):
     # Создаем пользователя
     user = models.User(email="contacts_user@example.com", hashed_password="hashed")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     # Создаем несколько контактов, принадлежащих пользователю
     # Добавляем требуемое поле email в данные контакта
@@ -86,56 +92,122 @@ def test_get_contacts(db: Session):
     ]
     for data in contact_data:
         contact_in = schemas.ContactCreate(**data)
-        crud.create_contact(db, contact_in, user.id)
+        await crud.create_contact(db, contact_in, user.id)
 
-    contacts = crud.get_contacts(db, user.id)
+    contacts = await crud.get_contacts(db, user.id)
     assert len(contacts) == len(contact_data)
     names = [contact.name for contact in contacts]
     for data in contact_data:
         assert data["name"] in names
 
 # Тест: создание контакта
-def test_create_contact(db: Session):
+async def test_create_contact(db: AsyncSession):
     # Создаем пользователя
     user = models.User(email="create_contact@example.com", hashed_password="hashed")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     # Добавляем требуемое поле email в данные контакта
     contact_data = {"name": "New Contact", "phone": "444-444-4444", "email": "newcontact@example.com"}
     contact_in = schemas.ContactCreate(**contact_data)
-    created_contact = crud.create_contact(db, contact_in, user.id)
+    created_contact = await crud.create_contact(db, contact_in, user.id)
     assert created_contact is not None
     assert created_contact.name == "New Contact"
     # Проверяем, что владелец контакта соответствует id пользователя
     assert created_contact.owner_id == user.id
 
 # Тест: получение конкретного контакта
-def test_get_contact(db: Session):
+async def test_get_contact(db: AsyncSession):
     # Создаем пользователя и контакт
     user = models.User(email="get_contact@example.com", hashed_password="hashed")
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     # Добавляем требуемое поле email в данные контакта
     contact_data = {"name": "Specific Contact", "phone": "555-555-5555", "email": "specific@example.com"}
     contact_in = schemas.ContactCreate(**contact_data)
-    created_contact = crud.create_contact(db, contact_in, user.id)
+    created_contact = await crud.create_contact(db, contact_in, user.id)
 
-    retrieved_contact = crud.get_contact(db, created_contact.id, user.id)
+    retrieved_contact = await crud.get_contact(db, created_contact.id, user.id)
     assert retrieved_contact is not None
     assert retrieved_contact.name == "Specific Contact"
 
 # Тест: обновление аватара пользователя
-def test_update_avatar(db: Session):
+async def test_update_avatar(db: AsyncSession):
     user = models.User(email="avatar_user@example.com", hashed_password="hashed", avatar_url=None)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     new_avatar_url = "https://example.com/avatar.png"
-    updated_user = crud.update_avatar(db, user, new_avatar_url)
+    updated_user = await crud.update_avatar(db, user.id, new_avatar_url)
     assert updated_user is not None
     assert updated_user.avatar_url == new_avatar_url
+
+# Тест: пошук контактів за префіксом імені, email та телефону
+async def test_search_contacts(db: AsyncSession):
+    user = models.User(email="search_user@example.com", hashed_password="hashed")
+    other = models.User(email="other_user@example.com", hashed_password="hashed")
+    db.add_all([user, other])
+    await db.commit()
+
+    contact_data = [
+        {"name": "John Smith", "phone": "555-1234", "email": "john@example.com"},
+        {"name": "Johanna Doe", "phone": "555-9876", "email": "jdoe@example.com"},
+        {"name": "Mary Major", "phone": "777-0000", "email": "mary@work.org"},
+    ]
+    for data in contact_data:
+        await crud.create_contact(db, schemas.ContactCreate(**data), user.id)
+    # Контакт іншого користувача не повинен потрапити у видачу
+    await crud.create_contact(db, schemas.ContactCreate(name="John Other", phone="1", email="o@example.com"), other.id)
+
+    assert {c.name for c in await crud.search_contacts(db, user.id, "joh")} == {"John Smith", "Johanna Doe"}
+    assert [c.name for c in await crud.search_contacts(db, user.id, "work.org")] == ["Mary Major"]
+    assert [c.name for c in await crud.search_contacts(db, user.id, "555-98")] == ["Johanna Doe"]
+    assert await crud.search_contacts(db, user.id, "zzz") == []
+    assert await crud.search_contacts(db, user.id, "***") == []
+    assert len(await crud.search_contacts(db, user.id, "555", limit=1)) == 1
+
+# Тест: кожен запис контактів збільшує версію контактів власника
+async def test_contact_writes_bump_contacts_version(db: AsyncSession):
+    user = models.User(email="version_user@example.com", hashed_password="hashed")
+    db.add(user)
+    await db.commit()
+    assert await crud.get_contacts_version(db, user.id) == 0
+
+    await crud.create_contact(db, schemas.ContactCreate(name="A", phone="1", email="a@example.com"), user.id)
+    assert await crud.get_contacts_version(db, user.id) == 1
+
+    batch = [schemas.ContactCreate(name=n, phone="1", email=f"{n}@example.com") for n in "bc"]
+    await crud.bulk_create_contacts(db, batch, user.id)
+    assert await crud.get_contacts_version(db, user.id) == 2
+
+# Власника вже немає: контакт не створюється, транзакція відкочується без IntegrityError
+async def test_create_contact_for_missing_owner(db: AsyncSession):
+    contact_in = schemas.ContactCreate(name="A", phone="1", email="a@example.com")
+    assert await crud.create_contact(db, contact_in, 999999) is None
+    assert await crud.bulk_create_contacts(db, [contact_in], 999999) is None
+    assert await db.scalar(select(func.count()).select_from(models.Contact)) == 0
+
+# Без підтримки RETURNING записи перечитують рядок і повертають ті самі дані
+async def test_writes_without_returning_support(db: AsyncSession, monkeypatch):
+    monkeypatch.setattr(crud, "_supports_returning", lambda db: False)
+    user = await crud.create_user(
+        db, schemas.UserCreate(email="fallback@example.com", password="secret"), hashed_password="hashed"
+    )
+    assert user.id is not None
+
+    contact_in = schemas.ContactCreate(name="Old", phone="1", email="old@example.com")
+    contact = await crud.create_contact(db, contact_in, user.id)
+    assert contact.id is not None and contact.version == 1 and contact.created_at is not None
+
+    contact_in = schemas.ContactCreate(name="New", phone="2", email="new@example.com")
+    updated = await crud.update_contact(db, contact.id, contact_in, user.id)
+    assert (updated.name, updated.version) == ("New", 2)
+    assert await crud.update_contact(db, contact.id + 1, contact_in, user.id) is None
+
+    verified = await crud.mark_email_verified(db, "fallback@example.com")
+    assert verified.is_verified and verified.token_version == 1
+    assert await crud.mark_email_verified(db, "fallback@example.com") is None
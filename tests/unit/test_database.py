@@ -0,0 +1,176 @@
+import anyio
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import database
+from app.main import app
+from app.replicas import get_read_db
+
+pytestmark = pytest.mark.anyio
+
+
+# Окрема тимчасова база, щоб не чіпати test.db інших тестів
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'pool.db'}"
+
+
+@pytest.fixture
+async def small_engine(url):
+    engine = database.make_engine(url, pool_size=1, max_overflow=0, pool_timeout=0.2, pre_ping="never")
+    yield engine
+    await engine.dispose()
+
+
+def test_async_database_url_switches_to_async_driver():
+    assert database.async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert database.async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+def test_make_engine_rejects_unknown_pre_ping_strategy(url):
+    with pytest.raises(ValueError):
+        database.make_engine(url, pre_ping="sometimes")
+
+
+# Метрики показують видане з'єднання та кількість видач
+async def test_pool_stats_report_checked_out_connections(small_engine):
+    async with small_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        stats = database.pool_stats(small_engine)
+        assert stats["checked_out"] == 1
+        assert stats["size"] == 1
+
+    stats = database.pool_stats(small_engine)
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 1
+    assert stats["overflow"] == 0
+
+
+# Другий запит чекає на єдине з'єднання: час очікування потрапляє в метрики, а після pool_timeout — тайм-аут
+async def test_pool_stats_report_wait_time_and_timeouts(small_engine):
+    async with small_engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            async with small_engine.connect():
+                pass
+
+    stats = database.pool_stats(small_engine)
+    assert stats["timeouts"] == 1
+    assert stats["wait_max_ms"] >= 150
+
+
+async def test_waiting_checkout_gets_released_connection(small_engine):
+    async def hold():
+        async with small_engine.connect():
+            await anyio.sleep(0.05)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(hold)
+        tg.start_soon(hold)
+
+    stats = database.pool_stats(small_engine)
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 0
+    assert stats["wait_max_ms"] > 0
+
+
+# Стратегія "idle": пінгуються лише з'єднання, що пролежали в пулі довше за поріг
+async def test_idle_pre_ping_checks_only_idle_connections(monkeypatch, url):
+    engine = database.make_engine(url, pool_size=1, max_overflow=0, pre_ping="idle", pre_ping_idle_seconds=0.05)
+    pings = []
+    monkeypatch.setattr(engine.sync_engine.dialect, "do_ping", lambda conn: pings.append(conn) or True)
+    try:
+        for _ in range(2):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        assert pings == []
+
+        await anyio.sleep(0.06)
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        assert len(pings) == 1
+    finally:
+        await engine.dispose()
+
+
+# Невдалий пінг: пул відкидає з'єднання і відкриває нове замість помилки в запиті
+async def test_failed_idle_ping_replaces_connection(monkeypatch, url):
+    engine = database.make_engine(url, pool_size=1, max_overflow=0, pre_ping="idle", pre_ping_idle_seconds=0)
+    calls = []
+
+    def flaky_ping(conn):
+        calls.append(conn)
+        if len(calls) == 1:
+            raise RuntimeError("server closed the connection")
+        return True
+
+    monkeypatch.setattr(engine.sync_engine.dialect, "do_ping", flaky_ping)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+        assert len(calls) == 1
+    finally:
+        await engine.dispose()
+
+
+# Сесія без запитів до бази не бере з'єднання з пулу і рахується як невикористана
+async def test_get_db_counts_sessions_that_used_a_connection(small_engine, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", async_sessionmaker(small_engine, expire_on_commit=False))
+    monkeypatch.setattr(database, "session_usage", database.SessionUsage())
+
+    async for db in database.get_db():
+        assert database.pool_stats(small_engine)["checkouts"] == 0
+    async for db in database.get_db():
+        await db.execute(text("SELECT 1"))
+
+    assert database.session_usage.stats() == {"opened": 2, "used": 1, "unused": 1, "used_ratio": 0.5}
+    assert database.pool_stats(small_engine)["checkouts"] == 1
+
+
+# release повертає з'єднання в пул, а сесія лишається придатною для наступних запитів
+async def test_release_returns_connection_to_pool(small_engine):
+    async with async_sessionmaker(small_engine)() as db:
+        await db.execute(text("SELECT 1"))
+        assert database.pool_stats(small_engine)["checked_out"] == 1
+        await database.release(db)
+        assert database.pool_stats(small_engine)["checked_out"] == 0
+        assert (await db.execute(text("SELECT 2"))).scalar() == 2
+
+
+# Запит з недійсним токеном відхиляється, не торкаючись бази
+def test_rejected_request_does_not_use_db(monkeypatch):
+    monkeypatch.delitem(app.dependency_overrides, get_read_db, raising=False)
+    monkeypatch.setattr(database, "session_usage", database.SessionUsage())
+
+    response = TestClient(app).get("/contacts/", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+    assert database.session_usage.stats()["opened"] == 1
+    assert database.session_usage.stats()["used"] == 0
+
+
+# Запит з сесіями запису й читання рахується один раз; використаним — якщо працювала хоч одна з них
+def test_session_usage_is_counted_once_per_request(monkeypatch):
+    monkeypatch.delitem(app.dependency_overrides, database.get_db, raising=False)
+    monkeypatch.delitem(app.dependency_overrides, get_read_db, raising=False)
+    monkeypatch.setattr(database, "session_usage", database.SessionUsage())
+
+    both = FastAPI()
+
+    @both.get("/both")
+    async def read_with_both_sessions(db=Depends(database.get_db), read_db=Depends(get_read_db)):
+        return (await read_db.execute(text("SELECT 1"))).scalar()
+
+    assert TestClient(both).get("/both").json() == 1
+    assert database.session_usage.stats() == {"opened": 1, "used": 1, "unused": 0, "used_ratio": 1.0}
+
+    # Ендпоінт запису з недійсним токеном: сесія запису та сесія автентифікації — один запит
+    response = TestClient(app).post(
+        "/contacts/", json={"name": "A", "phone": "1", "email": "a@example.com"},
+        headers={"Authorization": "Bearer not-a-token"},
+    )
+    assert response.status_code == 401
+    assert database.session_usage.stats() == {"opened": 2, "used": 1, "unused": 1, "used_ratio": 0.5}
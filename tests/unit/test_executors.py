@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from app import utils
+from app.executors import BoundedProcessPool, PoolSaturatedError
+
+
+# Хешування через пул процесів дає той самий результат, що й синхронна версія
+def test_password_hash_in_process_pool():
+    async def scenario():
+        hashed = await utils.get_password_hash_async("securepassword")
+        assert await utils.verify_password_async("securepassword", hashed)
+        assert not await utils.verify_password_async("wrongpassword", hashed)
+
+    asyncio.run(scenario())
+    assert utils.password_pool.stats()["completed"] >= 3
+
+# Коли воркери зайняті, а черга заповнена, запит відхиляється одразу
+def test_pool_rejects_when_saturated():
+    pool = BoundedProcessPool("test", max_workers=0, max_queue=1)
+
+    async def scenario():
+        # max_workers=0 виконує задачі в пулі потоків, ліміт черги при цьому діє так само
+        slow = [asyncio.create_task(pool.run(time.sleep, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(time.sleep, 0)
+        await asyncio.gather(*slow)
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["in_flight"] == 0
+
+# Задачі, що завершились помилкою, рахуються окремо і не потрапляють у затримки
+def test_pool_counts_failures_separately():
+    pool = BoundedProcessPool("test", max_workers=0, max_queue=1)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(int, "not a number")
+        assert await pool.run(int, "42") == 42
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert (stats["completed"], stats["failed"], stats["in_flight"]) == (1, 1, 0)
+
+# Скасований запит не звільняє місце, поки задача ще виконується, і не рахується помилкою
+def test_cancelled_caller_keeps_slot_until_task_finishes():
+    pool = BoundedProcessPool("test", max_workers=0, max_queue=0)
+
+    async def scenario():
+        caller = asyncio.create_task(pool.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        assert pool.in_flight == 1
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(time.sleep, 0)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["completed"], stats["failed"], stats["rejected"]) == (0, 1, 0, 1)
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, mailer, models
+from app.main import app
+from tests.conftest import TestingAsyncSessionLocal
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def worker(app_db, smtp_server):
+    smtp = mailer.SMTPPool(smtp_server.host, smtp_server.port, "user", "secret", size=2, use_tls=False, timeout=5)
+    worker = mailer.OutboxWorker(TestingAsyncSessionLocal, smtp, batch_size=10, backoff_base=60)
+    yield worker
+    smtp.close()
+
+
+def enqueue(*recipients):
+    async def scenario():
+        async with TestingAsyncSessionLocal() as db:
+            for recipient in recipients:
+                crud.enqueue_email(db, recipient, "Hello", f"Hi {recipient}")
+            await db.commit()
+
+    asyncio.run(scenario())
+
+
+def outbox(db):
+    db.expire_all()
+    return {email.recipient: email for email in db.query(models.OutboxEmail).all()}
+
+
+# Пачка листів іде через пул вже автентифікованих з'єднань, а не нове з'єднання на кожен лист
+def test_worker_sends_batches_over_pooled_connections(worker, smtp_server, app_db):
+    enqueue(*(f"user{i}@example.com" for i in range(6)))
+    assert asyncio.run(worker.run_once()) == 6
+    enqueue("late@example.com")
+    assert asyncio.run(worker.run_once()) == 1
+
+    assert len(smtp_server.messages) == 7
+    assert smtp_server.connections == 2
+    assert worker.smtp.stats()["connections_opened"] == 2
+    assert all(email.status == "sent" and email.sent_at for email in outbox(app_db).values())
+    recipients, message = smtp_server.messages[0]
+    assert message["Subject"] == "Hello"
+
+
+# Тимчасова відмова: лист лишається в черзі з відкладеним повтором; постійна — позначається failed
+def test_worker_retries_with_backoff(worker, smtp_server, app_db):
+    smtp_server.reject = {"busy@example.com": 451, "missing@example.com": 550}
+    enqueue("busy@example.com", "missing@example.com", "ok@example.com")
+    asyncio.run(worker.run_once())
+
+    emails = outbox(app_db)
+    assert emails["ok@example.com"].status == "sent"
+    assert emails["missing@example.com"].status == "failed"
+    busy = emails["busy@example.com"]
+    assert (busy.status, busy.attempts) == ("pending", 1)
+    assert "451" in busy.last_error
+    # Повтор ще не настав
+    assert asyncio.run(worker.run_once()) == 0
+
+    asyncio.run(worker.refresh_depth())
+    stats = worker.stats()
+    assert (stats["pending"], stats["failed"], stats["sent"], stats["retried"]) == (1, 1, 1, 1)
+
+
+def test_backoff_grows_exponentially_up_to_max(worker):
+    worker.backoff_max = 500
+    delays = [worker.backoff(attempt) for attempt in (1, 2, 3, 10)]
+    assert 54 <= delays[0] <= 66 and 108 <= delays[1] <= 132 and 216 <= delays[2] <= 264
+    assert delays[3] <= 550
+
+
+# Недоступний сервер: усі листи пачки лишаються в черзі
+def test_worker_keeps_emails_when_server_is_down(worker, app_db):
+    worker.smtp.port = 1
+    enqueue("a@example.com", "b@example.com")
+    assert asyncio.run(worker.run_once()) == 2
+    assert {email.status for email in outbox(app_db).values()} == {"pending"}
+
+
+# Реєстрація лише ставить лист у чергу: повільний SMTP-сервер на неї не впливає
+def test_register_queues_verification_email(app_db, smtp_server):
+    smtp_server.delay = 2
+    started = time.perf_counter()
+    response = client.post("/auth/register", json={"email": "queued@example.com", "password": "secret"})
+    assert response.status_code == 201
+    assert time.perf_counter() - started < 2
+    assert smtp_server.connections == 0
+
+    email = outbox(app_db)["queued@example.com"]
+    assert email.status == "pending"
+    assert "confirm-email?email=queued@example.com" in email.body
+
+
+# Фоновий воркер, запущений у циклі подій, відправляє лист одразу після wake()
+def test_background_worker_delivers_after_wake(worker, smtp_server):
+    async def scenario():
+        worker.poll_interval = 10
+        worker.start()
+        try:
+            await asyncio.sleep(0.1)
+            async with TestingAsyncSessionLocal() as db:
+                mailer.queue_verification_email(db, "woken@example.com")
+                await db.commit()
+            worker.wake()
+            for _ in range(50):
+                if smtp_server.messages:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await worker.stop()
+
+    asyncio.run(scenario())
+    assert smtp_server.messages[0][0] == ["woken@example.com"]
+    assert worker.stats()["running"] is False
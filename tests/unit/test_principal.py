@@ -0,0 +1,41 @@
+import dataclasses
+import struct
+
+import pytest
+
+from app import models
+from app.principal import Principal
+
+
+# Бінарне представлення відновлюється без втрат
+@pytest.mark.parametrize("avatar_url", [None, "https://example.com/аватар.png"])
+def test_principal_bytes_round_trip(avatar_url):
+    principal = Principal(
+        id=42, email="user@example.com", is_active=True, is_verified=False,
+        avatar_url=avatar_url, token_version=3
+    )
+    assert Principal.from_bytes(principal.to_bytes()) == principal
+
+# Дані в іншому форматі (наприклад, старий JSON-кеш) вважаються промахом
+def test_principal_from_bytes_rejects_foreign_format():
+    assert Principal.from_bytes(b'{"id": 1, "email": "user@example.com"}') is None
+    assert Principal.from_bytes(b"") is None
+
+# Обрізаний чи пошкоджений запис у Redis — теж промах, а не помилка запиту
+def test_principal_from_bytes_rejects_corrupt_payload():
+    data = Principal(
+        id=1, email="user@example.com", is_active=True, is_verified=True, avatar_url="https://example.com/a.png"
+    ).to_bytes()
+    assert Principal.from_bytes(struct.pack("!BqqB", 1, 1, 0, 0)) is None
+    for cut in range(len(data) - 1, 18, -7):
+        assert Principal.from_bytes(data[:cut]) is None
+    assert Principal.from_bytes(data + b"extra") is None
+    assert Principal.from_bytes(struct.pack("!BqqBH", 1, 1, 0, 0, 2) + b"\xff\xfe") is None
+
+# Principal будується з ORM-моделі і не дозволяє змін
+def test_principal_from_user_is_frozen():
+    user = models.User(id=1, email="user@example.com", is_active=True, is_verified=True)
+    principal = Principal.from_user(user)
+    assert principal.token_version == 0
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        principal.email = "other@example.com"
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import cache, crud, models, replicas, utils
+from app.database import Base
+from app.main import app
+from app.replicas import Replica, ReplicaRouter, get_read_db, user_scope
+from tests.conftest import TestingAsyncSessionLocal
+
+client = TestClient(app)
+
+
+# Порожня репліка в окремому файлі: за відповіддю видно, яка база обслужила читання
+@pytest.fixture
+def replica(tmp_path):
+    url = tmp_path / "replica.db"
+    sync_engine = create_engine(f"sqlite:///{url}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    return Replica(create_async_engine(f"sqlite+aiosqlite:///{url}", poolclass=NullPool))
+
+
+@pytest.fixture
+def replica_router(replica, app_db, monkeypatch):
+    router = ReplicaRouter([replica], primary=TestingAsyncSessionLocal, read_after_write=0.3)
+    monkeypatch.setattr(replicas, "router", router)
+    app.dependency_overrides.pop(get_read_db, None)
+    return router
+
+
+def test_router_without_replicas_reads_from_primary():
+    router = ReplicaRouter([], primary=TestingAsyncSessionLocal)
+    assert asyncio.run(router.sessionmaker_for("user:a@example.com")) is TestingAsyncSessionLocal
+    assert not router.enabled
+
+
+# Записи користувача на read_after_write секунд прив'язують його читання до основної бази
+def test_pinned_scope_reads_from_primary_until_window_expires(replica):
+    router = ReplicaRouter([replica], primary=TestingAsyncSessionLocal, read_after_write=0.1)
+    router.pin("user:a@example.com")
+
+    async def scenario():
+        assert await router.sessionmaker_for("user:a@example.com") is TestingAsyncSessionLocal
+        assert await router.sessionmaker_for("user:b@example.com") is replica.sessionmaker
+        await asyncio.sleep(0.15)
+        assert await router.sessionmaker_for("user:a@example.com") is replica.sessionmaker
+
+    asyncio.run(scenario())
+    assert router.primary_reads == 1
+    assert replica.reads == 2
+
+
+# Обмежена застарілість: репліка з завеликим відставанням або недоступна не обслуговує читання
+def test_lagging_replica_is_skipped(replica, monkeypatch):
+    router = ReplicaRouter([replica], primary=TestingAsyncSessionLocal, max_lag=1.0)
+
+    async def lag():
+        return 5.0
+
+    monkeypatch.setattr(replica, "current_lag", lag)
+    assert asyncio.run(router.sessionmaker_for(None)) is TestingAsyncSessionLocal
+
+    async def unavailable():
+        return None
+
+    monkeypatch.setattr(replica, "current_lag", unavailable)
+    assert asyncio.run(router.sessionmaker_for(None)) is TestingAsyncSessionLocal
+
+
+def test_replica_lag_check_on_sqlite(replica):
+    assert asyncio.run(replica.current_lag()) == 0.0
+
+
+# Після запису контакту список читається з основної бази, а після вікна read-after-write — з репліки
+def test_contacts_read_after_write(replica_router, replica, app_db):
+    user = models.User(email="reader@example.com", hashed_password="hashed", is_active=True, is_verified=True)
+    app_db.add(user)
+    app_db.commit()
+    headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': user.email})}"}
+
+    response = client.post("/contacts/", json={"name": "Ann", "phone": "1", "email": "ann@example.com"}, headers=headers)
+    assert response.status_code == 201
+
+    response = client.get("/contacts/", headers=headers)
+    assert [c["name"] for c in response.json()] == ["Ann"]
+    assert replica.reads == 0
+
+    time.sleep(0.35)
+    # Репліка ще не знає цього користувача, тож автентифікація з неї не проходить
+    cache.user_cache.clear()
+    response = client.get("/contacts/", headers=headers)
+    assert response.status_code == 401
+    assert replica.reads == 1
+
+
+# Зміна рядка користувача прив'язує його читання до основної бази навіть без його токена
+def test_user_write_pins_user_scope(replica_router, app_db):
+    app_db.add(models.User(email="verify@example.com", hashed_password="hashed", is_active=True))
+    app_db.commit()
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as session:
+            await crud.mark_email_verified(session, "verify@example.com")
+        assert await replica_router.is_pinned(user_scope("verify@example.com"))
+        assert not await replica_router.is_pinned(user_scope("other@example.com"))
+
+    asyncio.run(scenario())
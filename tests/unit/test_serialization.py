@@ -0,0 +1,25 @@
+import json
+
+from app import models, schemas
+from app.serialization import Serializer, dumps, json_response
+
+
+# Серіалізатор дає той самий JSON, що й ContactResponse, але без валідації
+def test_serializer_matches_response_model():
+    contact = models.Contact(id=1, name="Alice", phone="555", email="alice@example.com", owner_id=7)
+    expected = schemas.ContactResponse.model_validate(contact).model_dump()
+    serializer = Serializer.for_model(schemas.ContactResponse)
+    assert serializer.to_dict(contact) == expected
+    assert json.loads(dumps(serializer.to_list([contact, contact]))) == [expected, expected]
+
+# Серіалізатор з одним полем (attrgetter повертає значення, а не кортеж)
+def test_serializer_single_field():
+    contact = models.Contact(id=3, name="Bob")
+    assert Serializer(["name"]).to_list([contact]) == [{"name": "Bob"}]
+
+# Готове тіло віддається без повторного кодування
+def test_json_response_passes_bytes_through():
+    response = json_response(b'{"a":1}', headers={"ETag": "x"})
+    assert response.body == b'{"a":1}'
+    assert response.headers["etag"] == "x"
+    assert json_response({"a": [1, 2]}).body == b'{"a":[1,2]}'
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import models, sql_metrics
+from app.auth import get_current_principal
+from app.main import app
+from app.principal import Principal
+from tests.conftest import QueryBudgetExceeded, TestingAsyncSessionLocal, query_budget
+
+# Застосунок, обгорнутий middleware інструментації (у застосунку вона вмикається налаштуванням)
+client = TestClient(sql_metrics.SQLInstrumentationMiddleware(app))
+
+
+@pytest.fixture
+def owner(app_db):
+    user = models.User(email="timing@example.com", hashed_password="hashed", is_active=True, is_verified=True)
+    app_db.add(user)
+    app_db.commit()
+    app_db.refresh(user)
+    app.dependency_overrides[get_current_principal] = lambda: Principal.from_user(user)
+    yield user
+    app.dependency_overrides.pop(get_current_principal, None)
+
+
+def run_queries(*statements):
+    async def scenario():
+        async with TestingAsyncSessionLocal() as db:
+            for statement in statements:
+                await db.execute(text(statement))
+
+    asyncio.run(scenario())
+
+
+# Server-Timing містить кількість запитів ендпоінта і час у базі
+def test_server_timing_header_and_log_line(owner, caplog):
+    with caplog.at_level(logging.INFO, logger="app.sql_metrics"):
+        response = client.get("/contacts/")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    # Версія контактів для ETag і сама сторінка
+    assert 'desc="2 queries"' in timing
+    assert "db-slowest;dur=" in timing
+    assert "GET /contacts/: 2 queries" in caplog.text
+
+
+def test_track_flags_repeated_statements():
+    with sql_metrics.track() as stats:
+        run_queries(*["SELECT 1"] * 4, "SELECT 2")
+    assert stats.count == 5
+    assert stats.repeated(3) == [("SELECT 1", 4)]
+    assert stats.slowest_statement in {"SELECT 1", "SELECT 2"}
+
+
+# Поза track() та middleware запити не рахуються
+def test_only_tracked_queries_are_counted():
+    run_queries("SELECT 1")
+    with sql_metrics.track() as stats:
+        run_queries("SELECT 2")
+    run_queries("SELECT 3")
+    assert list(stats.statements) == ["SELECT 2"]
+
+
+def test_n_plus_one_is_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.sql_metrics"):
+        with sql_metrics.track() as stats:
+            run_queries(*["SELECT 1"] * 3)
+        sql_metrics.SQLInstrumentationMiddleware._log({"method": "GET", "path": "/x"}, stats)
+    assert "possible N+1, statement repeated 3 times: SELECT 1" in caplog.text
+
+
+# Бюджет запитів у тестах: перевищення кількості або повтори падають з QueryBudgetExceeded
+def test_query_budget(owner):
+    with query_budget(2, max_repeats=1):
+        assert client.get("/contacts/").status_code == 200
+
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(2):
+            run_queries("SELECT 1", "SELECT 2", "SELECT 3")
+
+    with pytest.raises(QueryBudgetExceeded, match="repeated 2 times"):
+        with query_budget(10, max_repeats=1):
+            run_queries("SELECT 1", "SELECT 1")
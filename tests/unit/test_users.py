@@ -1,12 +1,16 @@
+import asyncio
+import hashlib
 import io
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
-from unittest.mock import patch, MagicMock
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import ANY, patch, MagicMock
 import pytest
+from PIL import Image
 
 from app.main import app
-from app import models, schemas
+from app import avatars, cache, models, schemas, utils
 from app.database import get_db
+from app.replicas import get_read_db
 
 client = TestClient(app)
 
@@ -23,18 +27,22 @@ dummy_user = models.User(
 # Фикстура для подмены зависимости get_db (если потребуется работать с сессией)
 def override_get_db():
     # Можно вернуть мок-объект сессии
-    db = MagicMock(spec=Session)
+    db = MagicMock(spec=AsyncSession)
     return db
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+
+# Токен для dummy_user, який розпізнає спільна залежність get_current_user
+valid_token = utils.create_access_token({"sub": dummy_user.email})
 
 # Тест для эндпоинта /users/me с валидным токеном
 def test_read_users_me_valid_token():
-    # Патчим функцию, которая ищет пользователя по токену, чтобы вернуть dummy_user
-    with patch("app.crud.get_user_by_token", return_value=dummy_user):
+    # Патчим функцию, которая ищет пользователя по email из токена, чтобы вернуть dummy_user
+    with patch("app.crud.get_user_by_email", return_value=dummy_user):
         response = client.get(
             "/users/me",
-            headers={"Authorization": "Bearer valid-token"}
+            headers={"Authorization": f"Bearer {valid_token}"}
         )
     assert response.status_code == 200
     data = response.json()
@@ -43,15 +51,28 @@ def test_read_users_me_valid_token():
 
 # Тест для эндпоинта /users/me с невалидным токеном
 def test_read_users_me_invalid_token():
-    # Если пользователь не найден, функция get_user_by_token возвращает None
-    with patch("app.crud.get_user_by_token", return_value=None):
+    # Если токен не удаётся декодировать, пользователь даже не ищется в БД
+    with patch("app.crud.get_user_by_email", return_value=None) as mock_get_user:
         response = client.get(
             "/users/me",
             headers={"Authorization": "Bearer invalid-token"}
         )
     assert response.status_code == 401
     data = response.json()
-    assert data["detail"] == "Invalid authentication credentials"
+    assert data["detail"] == "Could not validate credentials"
+    mock_get_user.assert_not_called()
+
+# Тест: повторные запросы обслуживаются из кеша без обращения к БД
+def test_read_users_me_served_from_cache():
+    asyncio.run(cache.invalidate_user(dummy_user.email))
+    with patch("app.crud.get_user_by_email", return_value=dummy_user) as mock_get_user:
+        for _ in range(3):
+            response = client.get(
+                "/users/me",
+                headers={"Authorization": f"Bearer {valid_token}"}
+            )
+            assert response.status_code == 200
+    mock_get_user.assert_called_once()
 
 # Тест для эндпоинта /users/me/avatar при успешной загрузке изображения
 def test_update_avatar_success():
@@ -61,26 +82,37 @@ def test_update_avatar_success():
     updated_user = dummy_user
     updated_user.avatar_url = dummy_avatar_url
 
-    # Создаем фиктивный image-файл
-    image_content = b"fake image data"
-    file = io.BytesIO(image_content)
-    file.name = "avatar.png"
+    # Создаем настоящий PNG: конвейер уменьшает изображение перед загрузкой
+    file = io.BytesIO()
+    Image.new("RGB", (640, 480), "navy").save(file, "PNG")
+    content_hash = hashlib.sha256(file.getvalue()).hexdigest()
+    file.seek(0)
+    uploaded_before = avatars.pipeline.uploaded
 
-    with patch("app.crud.get_user_by_token", return_value=dummy_user):
-        # Патчим функцию обновления аватара, чтобы возвращалась обновленная модель пользователя
-        with patch("app.crud.update_avatar", return_value=updated_user) as mock_update_avatar:
+    with patch("app.crud.get_user_by_email", return_value=dummy_user):
+        # Файла ещё нет в таблице дедупликации; обновление аватара возвращает обновленную модель
+        with patch("app.crud.get_avatar_url", return_value=None) as mock_lookup, \
+                patch("app.crud.update_avatar", return_value=updated_user) as mock_update_avatar:
             # Патчим функцию загрузки в Cloudinary; патчим напрямую cloudinary.uploader.upload
             with patch("cloudinary.uploader.upload", return_value={"secure_url": dummy_avatar_url}) as mock_upload:
                 response = client.post(
                     "/users/me/avatar",
-                    headers={"Authorization": "Bearer valid-token"},
+                    headers={"Authorization": f"Bearer {valid_token}"},
                     files={"file": ("avatar.png", file, "image/png")}
                 )
     assert response.status_code == 200
     data = response.json()
     assert data["avatar_url"] == dummy_avatar_url
+    # Конвейер ищет файл по SHA-256 содержимого
+    assert mock_lookup.call_args.args[1] == content_hash
     mock_upload.assert_called_once()
-    mock_update_avatar.assert_called_once()
+    # В Cloudinary уходит уменьшенный WebP под ключом-хешем, а не исходный файл
+    uploaded = Image.open(io.BytesIO(mock_upload.call_args.args[0]))
+    assert uploaded.format == "WEBP" and uploaded.size == (256, 256)
+    assert mock_upload.call_args.kwargs["public_id"] == content_hash
+    assert avatars.pipeline.uploaded == uploaded_before + 1
+    # Хеш сохраняется вместе с новым URL
+    mock_update_avatar.assert_called_once_with(ANY, dummy_user.id, dummy_avatar_url, content_hash=content_hash)
 
 # Тест для эндпоинта /users/me/avatar с некорректным типом файла (не изображение)
 def test_update_avatar_invalid_file_type():
@@ -89,10 +121,10 @@ def test_update_avatar_invalid_file_type():
     file = io.BytesIO(file_content)
     file.name = "file.txt"
 
-    with patch("app.crud.get_user_by_token", return_value=dummy_user):
+    with patch("app.crud.get_user_by_email", return_value=dummy_user):
         response = client.post(
             "/users/me/avatar",
-            headers={"Authorization": "Bearer valid-token"},
+            headers={"Authorization": f"Bearer {valid_token}"},
             files={"file": ("file.txt", file, "text/plain")}
         )
     assert response.status_code == 400
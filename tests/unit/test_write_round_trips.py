@@ -0,0 +1,145 @@
+import asyncio
+import io
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import models
+from app.auth import get_current_principal, get_current_user
+from app.config import settings
+from app.main import app
+from app.principal import Principal
+from app.routers import password_reset
+from tests.conftest import TestingAsyncSessionLocal, count_queries
+
+client = TestClient(app)
+
+
+# Користувач у тестовій БД; автентифікацію підміняємо, щоб рахувати лише запити самого ендпоінта
+@pytest.fixture
+def user(app_db):
+    user = models.User(email="writer@example.com", hashed_password="hashed", is_active=True, is_verified=False)
+    app_db.add(user)
+    app_db.commit()
+    app_db.refresh(user)
+    principal = Principal.from_user(user)
+    app.dependency_overrides[get_current_principal] = lambda: principal
+    app.dependency_overrides[get_current_user] = lambda: principal
+    yield user
+    app.dependency_overrides.pop(get_current_principal, None)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def create_contact():
+    response = client.post("/contacts/", json={"name": "Ann", "phone": "1", "email": "ann@example.com"})
+    assert response.status_code == 201
+    return response.json()
+
+
+# Реєстрація: перевірка email (до дорогого bcrypt), INSERT … RETURNING без refresh
+# і лист підтвердження в черзі в тій самій транзакції
+def test_register_queries(app_db):
+    with count_queries() as queries:
+        response = client.post("/auth/register", json={"email": "new@example.com", "password": "secret"})
+    assert response.status_code == 201
+    assert response.json()["id"] > 0
+    assert len(queries) == 3
+    assert queries[1].startswith("INSERT INTO users") and "RETURNING" in queries[1]
+    assert queries[2].startswith("INSERT INTO email_outbox")
+
+
+def test_confirm_email_is_one_query(user):
+    with count_queries() as queries:
+        response = client.get("/auth/confirm-email", params={"email": user.email})
+    assert response.status_code == 200
+    assert response.json()["is_verified"] is True
+    assert len(queries) == 1
+
+
+def test_confirm_email_errors_still_distinguished(user):
+    assert client.get("/auth/confirm-email", params={"email": "nobody@example.com"}).status_code == 404
+    client.get("/auth/confirm-email", params={"email": user.email})
+    response = client.get("/auth/confirm-email", params={"email": user.email})
+    assert response.status_code == 400
+
+
+def test_reset_password_is_one_query(user):
+    token = password_reset.create_password_reset_token(user.email)
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as db:
+            with count_queries() as queries:
+                result = await password_reset.reset_password(
+                    token, password_reset.PasswordReset(new_password="new-secret"), db
+                )
+        return result, queries
+
+    result, queries = asyncio.run(scenario())
+    assert result == {"message": "Пароль успішно скинуто."}
+    assert len(queries) == 1
+
+
+# Аватар: пошук за хешем файлу, запис хешу та UPDATE … RETURNING; повторний файл — без запису хешу
+def test_update_avatar_queries(user):
+    png = io.BytesIO()
+    Image.new("RGB", (32, 32), "red").save(png, "PNG")
+    for expected in (3, 2):
+        with patch("cloudinary.uploader.upload", return_value={"secure_url": "https://example.com/a.webp"}), \
+                count_queries() as queries:
+            response = client.post("/users/me/avatar", files={"file": ("a.png", png.getvalue(), "image/png")})
+        assert response.status_code == 200
+        assert response.json()["avatar_url"] == "https://example.com/a.webp"
+        assert len(queries) == expected
+    assert queries[-1].startswith("UPDATE users") and "RETURNING" in queries[-1]
+
+
+# Записи контактів: UPDATE версії власника … RETURNING та один запис контакту
+def test_create_contact_queries(user):
+    with count_queries() as queries:
+        contact = create_contact()
+    assert contact["name"] == "Ann"
+    assert len(queries) == 2
+
+
+def test_update_contact_queries(user):
+    contact = create_contact()
+    with count_queries() as queries:
+        response = client.put(
+            f"/contacts/{contact['id']}", json={"name": "Anna", "phone": "2", "email": "anna@example.com"}
+        )
+    assert response.status_code == 200
+    assert response.json()["name"] == "Anna"
+    assert len(queries) == 2
+
+
+def test_delete_contact_queries(user, app_db):
+    contact = create_contact()
+    with count_queries() as queries:
+        assert client.delete(f"/contacts/{contact['id']}").status_code == 204
+    assert len(queries) == 2
+    # Невдала спроба відкочує збільшену версію власника
+    assert client.delete(f"/contacts/{contact['id']}").status_code == 404
+    app_db.expire_all()
+    assert app_db.get(models.User, user.id).contacts_version == 2
+
+
+# Імпорт: на кожну пачку — UPDATE версії власника і одна вставка всіх рядків, без перечитування
+def test_import_contacts_queries(user, monkeypatch):
+    monkeypatch.setattr(settings, "CONTACT_IMPORT_BATCH_SIZE", 2)
+    rows = "name,phone,email\n" + "".join(f"C{i},{i},c{i}@example.com\n" for i in range(5))
+    with count_queries() as queries:
+        response = client.post("/contacts/import", files={"file": ("contacts.csv", rows, "text/csv")})
+    assert response.json()["imported"] == 5
+    assert len(queries) == 6
+    assert [q.split()[0] for q in queries] == ["UPDATE", "INSERT"] * 3
+
+
+# Повторний лист підтвердження: пошук користувача і запис у чергу листів
+def test_send_verification_email_queries(user):
+    with count_queries() as queries:
+        response = client.post("/auth/send-verification-email", params={"email": user.email})
+    assert response.status_code == 200
+    assert len(queries) == 2
+    assert queries[1].startswith("INSERT INTO email_outbox")